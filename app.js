@@ -1622,6 +1622,8 @@ class AudioPracticeController {
     this.currentBlankIndex = 0;
     this.userAnswers = {};
     this.completedBlanks = 0;
+    this.missedWords = [];
+    this.hasUnsyncedMisses = false;
     this.isPlaying = false;
     this.isWaitingForInput = false;
     
@@ -1631,9 +1633,71 @@ class AudioPracticeController {
   init() {
     this.createUI();
     this.setupAudioListeners();
+    this.connectPracticeChannel();
     this.startPractice();
   }
   
+  // Stream answers over a WebSocket so the server validates and batches progress writes
+  connectPracticeChannel() {
+    const sessionId = this.track?.session_id;
+    if (!sessionId || typeof sessionId === 'number') {
+      return; // Local tracks validate in the browser
+    }
+    
+    const socket = new WebSocket(`ws://localhost:8000/ws/practice/${sessionId}`);
+    this.socket = socket;
+    this.channelReady = false;
+    this.pendingAnswer = null;
+    
+    socket.addEventListener('message', (event) => {
+      if (this.socket !== socket) return; // A restart replaced this channel
+      const message = JSON.parse(event.data);
+      if (message.type === 'schedule') {
+        // The server validates by blank index, so only use it if its blanks are the ones shown here
+        const matches = message.blanks.length === this.blanks.length && message.blanks.every((blank, index) =>
+          blank.line_index === this.blanks[index].line_index && blank.word_position === this.blanks[index].word_position
+        );
+        if (matches) {
+          this.channelReady = true;
+        } else {
+          console.warn('Practice channel blanks differ from this player (re-blanked?), checking answers locally');
+          this.closePracticeChannel();
+        }
+      } else if (message.type === 'result' && this.pendingAnswer && message.blank_index === this.pendingAnswer.blankIndex) {
+        this.pendingAnswer = null;
+        this.submitButton.disabled = false;
+        this.showAnswerResult(message.correct, message.correct_answer, false);
+      } else if (message.type === 'error') {
+        console.error('Practice channel error:', message.detail);
+        this.recoverPendingAnswer();
+      }
+    });
+    socket.addEventListener('close', () => {
+      if (this.socket !== socket) return;
+      this.socket = null;
+      this.channelReady = false;
+      this.recoverPendingAnswer();
+    });
+  }
+  
+  closePracticeChannel() {
+    const socket = this.socket;
+    this.socket = null;
+    this.channelReady = false;
+    if (socket) {
+      socket.close();
+    }
+  }
+  
+  // An answer the server never answered - check it here and save over HTTP instead
+  recoverPendingAnswer() {
+    if (!this.pendingAnswer) return;
+    const { answer } = this.pendingAnswer;
+    this.pendingAnswer = null;
+    this.submitButton.disabled = false;
+    this.checkAnswerLocally(answer);
+  }
+  
   createUI() {
     // Clear container
     this.container.innerHTML = '';
@@ -1898,20 +1962,47 @@ class AudioPracticeController {
   }
   
   checkAnswer() {
-    const currentBlank = this.blanks[this.currentBlankIndex];
     const userAnswer = this.currentInput.value.trim().toLowerCase();
-    const correctAnswer = currentBlank.original_word.toLowerCase();
     
-    if (userAnswer === correctAnswer) {
+    // Let the server validate (and persist) when the practice channel is open and in sync
+    if (this.channelReady && this.socket && this.socket.readyState === WebSocket.OPEN) {
+      this.submitButton.disabled = true;
+      this.pendingAnswer = { blankIndex: this.currentBlankIndex, answer: userAnswer };
+      this.socket.send(JSON.stringify({
+        type: 'answer',
+        blank_index: this.currentBlankIndex,
+        answer: userAnswer
+      }));
+      return;
+    }
+    
+    this.checkAnswerLocally(userAnswer);
+  }
+  
+  checkAnswerLocally(userAnswer) {
+    const currentBlank = this.blanks[this.currentBlankIndex];
+    const correctAnswer = currentBlank.original_word.toLowerCase();
+    this.showAnswerResult(userAnswer === correctAnswer, currentBlank.original_word, true);
+  }
+  
+  showAnswerResult(correct, correctAnswer, syncRemote) {
+    if (correct) {
       // Correct answer
       this.feedbackText.textContent = '✅ Correct!';
       this.feedbackText.style.color = '#10b981';
       this.completedBlanks++;
-      this.updateProgress();
+      this.updateProgress(syncRemote);
     } else {
       // Wrong answer
-      this.feedbackText.textContent = `❌ Incorrect. The correct answer is: "${currentBlank.original_word}"`;
+      this.feedbackText.textContent = `❌ Incorrect. The correct answer is: "${correctAnswer}"`;
       this.feedbackText.style.color = '#ef4444';
+      this.missedWords.push(correctAnswer);
+      
+      // Keep it locally - missed words reach the class analytics with the next save or at completion
+      if (this.track) {
+        savePracticeProgress(this.track, this.completedBlanks, this.blanks.length, this.missedWords, false);
+        this.hasUnsyncedMisses = this.hasUnsyncedMisses || syncRemote;
+      }
     }
     
     this.submitButton.style.display = 'none';
@@ -1958,16 +2049,19 @@ class AudioPracticeController {
     }
   }
   
-  updateProgress() {
+  updateProgress(syncRemote = true) {
     this.progressText.textContent = `Practice Progress: ${this.completedBlanks}/${this.blanks.length} completed`;
     this.progressFill.style.width = `${(this.completedBlanks / this.blanks.length) * 100}%`;
     
     // Update progressive lyrics
     this.updateProgressiveLyrics();
     
-    // Save progress
+    // Save progress (missed words so far go along with it)
     if (this.track) {
-      savePracticeProgress(this.track, this.completedBlanks, this.blanks.length);
+      savePracticeProgress(this.track, this.completedBlanks, this.blanks.length, this.missedWords, syncRemote);
+      if (syncRemote) {
+        this.hasUnsyncedMisses = false;
+      }
     }
   }
   
@@ -1996,6 +2090,15 @@ class AudioPracticeController {
   }
   
   handlePracticeComplete() {
+    // Closing the channel makes the server write this session's progress right away
+    this.closePracticeChannel();
+    
+    // Answers checked in the browser still owe the server their trailing missed words
+    if (this.hasUnsyncedMisses && this.track) {
+      savePracticeProgress(this.track, this.completedBlanks, this.blanks.length, this.missedWords, true);
+      this.hasUnsyncedMisses = false;
+    }
+    
     this.currentBlankText.textContent = '🎉 Practice Complete!';
     this.inputContainer.innerHTML = `
       <div style="color: #10b981; font-size: 16px; font-weight: 500;">
@@ -2031,8 +2134,12 @@ class AudioPracticeController {
   restart() {
     this.currentBlankIndex = 0;
     this.completedBlanks = 0;
+    this.missedWords = [];
+    this.hasUnsyncedMisses = false;
     this.userAnswers = {};
+    this.closePracticeChannel();
     this.createUI();
+    this.connectPracticeChannel();
     this.startPractice();
   }
 }
@@ -2223,7 +2330,7 @@ function initPracticeSection() {
 }
 
 // Save practice progress to localStorage and MongoDB
-function savePracticeProgress(track, completedBlanks, totalBlanks) {
+function savePracticeProgress(track, completedBlanks, totalBlanks, missedWords = [], syncRemote = true) {
   // Update localStorage
   const tracks = loadTracks();
   const trackIndex = tracks.findIndex(t => t.id === track.id);
@@ -2238,13 +2345,15 @@ function savePracticeProgress(track, completedBlanks, totalBlanks) {
     
     saveTracks(tracks);
     
-    // Update MongoDB via API using session_id
-    savePracticeProgressToMongoDB(track.session_id, completedBlanks, totalBlanks);
+    // Update MongoDB via API using session_id (the practice channel already persists its answers)
+    if (syncRemote) {
+      savePracticeProgressToMongoDB(track.session_id, completedBlanks, totalBlanks, missedWords);
+    }
   }
 }
 
 // Save practice progress to MongoDB
-async function savePracticeProgressToMongoDB(sessionId, completedBlanks, totalBlanks) {
+async function savePracticeProgressToMongoDB(sessionId, completedBlanks, totalBlanks, missedWords = []) {
   try {
     // Skip MongoDB save for local tracks (they don't have session_id)
     if (!sessionId || typeof sessionId === 'number') {
@@ -2262,7 +2371,8 @@ async function savePracticeProgressToMongoDB(sessionId, completedBlanks, totalBl
         completed_blanks: completedBlanks,
         total_blanks: totalBlanks,
         completion_rate: Math.round((completedBlanks / totalBlanks) * 100),
-        last_practiced: new Date().toISOString()
+        last_practiced: new Date().toISOString(),
+        missed_words: missedWords
       })
     });
     
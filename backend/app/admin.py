@@ -0,0 +1,105 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from backend.app.config import ADMIN_TOKEN, PROFILE_DIR
+from backend.app import retention, tracing, plan_cache, analytics, llm_memo, bundles
+import os
+
+
+def require_admin(x_admin_token: str = Header(default=None)):
+    """Only allow requests carrying the configured ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+admin_router = APIRouter(prefix="/api/admin", dependencies=[Depends(require_admin)])
+
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float  # Fraction of requests to CPU-profile, 0 turns profiling off
+
+
+@admin_router.get("/retention/report")
+def get_retention_report():
+    """Collection size, retention candidates and whether compaction is worthwhile"""
+    return retention.compaction_report()
+
+
+@admin_router.post("/retention/archive")
+def run_archival():
+    """Archive idle sessions now instead of waiting for the background sweep"""
+    return retention.archive_inactive_sessions()
+
+
+@admin_router.get("/traces")
+def list_traces(limit: int = 50):
+    """Most recent request span trees"""
+    return tracing.get_traces(limit)
+
+
+@admin_router.get("/traces/{trace_id}")
+def get_trace(trace_id: str):
+    trace = tracing.get_trace(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found (it may have left the ring buffer)")
+    return {**trace, "background_traces": tracing.get_background_traces(trace_id)}
+
+
+@admin_router.get("/profiling")
+def get_profiling():
+    """Current profiling sample rate and the saved profiles"""
+    return {"sample_rate": tracing.profiling["sample_rate"], "profiles": tracing.list_profiles()}
+
+
+@admin_router.post("/profiling")
+def set_profiling(settings: ProfilingSettings):
+    """Turn sampling CPU profiling on for a fraction of requests"""
+    tracing.set_profile_sample_rate(settings.sample_rate)
+    return {"sample_rate": tracing.profiling["sample_rate"]}
+
+
+@admin_router.get("/profiling/{profile_name}")
+def download_profile(profile_name: str):
+    """Collapsed-stack profile, ready for flamegraph.pl or speedscope"""
+    if profile_name not in tracing.list_profiles():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(os.path.join(PROFILE_DIR, profile_name), media_type="text/plain")
+
+
+@admin_router.get("/plan-cache")
+def get_plan_cache():
+    """Cached composition plan templates and hit/miss counters"""
+    return plan_cache.get_stats()
+
+
+@admin_router.delete("/plan-cache")
+def invalidate_plan_cache(genre: Optional[str] = None):
+    """Drop cached plan templates for one genre, or all of them if no genre is given"""
+    return {"removed": plan_cache.invalidate(genre)}
+
+
+@admin_router.get("/llm-memo")
+def get_llm_memo():
+    """Memoized Gemini responses and hit/miss counters"""
+    return llm_memo.get_stats()
+
+
+@admin_router.delete("/llm-memo")
+def clear_llm_memo():
+    """Drop every memoized Gemini response (other workers' in-memory copies survive until they restart)"""
+    return {"removed": llm_memo.clear()}
+
+
+@admin_router.get("/bundles")
+def get_bundle_cache():
+    """Built offline bundles and hit/build/eviction counters"""
+    return bundles.get_stats()
+
+
+@admin_router.post("/analytics/backfill")
+def backfill_analytics():
+    """Rebuild the practice analytics counters from all existing sessions"""
+    return analytics.backfill()
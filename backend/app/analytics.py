@@ -0,0 +1,145 @@
+from datetime import datetime
+from backend.app.database import db
+
+# Pre-aggregated practice analytics.
+#
+# practice_stats holds one counter document per (subject, music_genre) and blank_misses
+# one per (subject, word). save_practice_progress reads the session's previous progress
+# atomically with its write, so record_progress can $inc exactly the difference and the
+# dashboards never have to scan sessions. backfill() rebuilds both collections from the
+# sessions collection with an aggregation pipeline.
+
+
+def ensure_indexes():
+    db.practice_stats.create_index([("subject", 1), ("music_genre", 1)], unique=True)
+    db.blank_misses.create_index([("subject", 1), ("word", 1)], unique=True)
+    db.blank_misses.create_index([("subject", 1), ("misses", -1)])
+
+
+def _was_practiced(progress: dict) -> bool:
+    # Demo sessions are seeded with an empty progress record that was never practiced
+    return bool(progress) and progress.get("last_practiced") is not None
+
+
+def record_progress(before: dict, progress, missed_words: list):
+    """Apply the change between a session's previous progress and the new one to the counters"""
+    old = before.get("practice_progress") or {}
+    practiced_before = _was_practiced(old)
+
+    increments = {
+        "saves": 1,
+        "completed_blanks": progress.completed_blanks - (old.get("completed_blanks", 0) if practiced_before else 0),
+        "total_blanks": progress.total_blanks - (old.get("total_blanks", 0) if practiced_before else 0),
+        "sessions_practiced": 0 if practiced_before else 1,
+        "sessions_completed": int(progress.completion_rate >= 100) - int(practiced_before and old.get("completion_rate", 0) >= 100)
+    }
+
+    subject = before.get("subject", "")
+    music_genre = (before.get("music_genre") or "").lower()
+    db.practice_stats.update_one(
+        {"subject": subject, "music_genre": music_genre},
+        {"$inc": increments, "$set": {"updated_at": datetime.now()}},
+        upsert=True
+    )
+
+    # Only count a missed word once per session, however many times the student retries it
+    already_missed = {word.lower() for word in before.get("practice_missed_words", [])}
+    for word in {word.lower() for word in missed_words} - already_missed:
+        db.blank_misses.update_one(
+            {"subject": subject, "word": word},
+            {"$inc": {"misses": 1}, "$set": {"updated_at": datetime.now()}},
+            upsert=True
+        )
+
+
+def _summary_row(doc: dict) -> dict:
+    practiced = doc.get("sessions_practiced", 0)
+    total_blanks = doc.get("total_blanks", 0)
+    return {
+        "subject": doc["subject"],
+        "music_genre": doc["music_genre"],
+        "sessions_practiced": practiced,
+        "sessions_completed": doc.get("sessions_completed", 0),
+        "completion_rate": round(100 * doc.get("sessions_completed", 0) / practiced, 1) if practiced else 0,
+        "blank_accuracy": round(100 * doc.get("completed_blanks", 0) / total_blanks, 1) if total_blanks else 0,
+        "saves": doc.get("saves", 0)
+    }
+
+
+def get_summary(subject: str = None, music_genre: str = None) -> list:
+    """Completion rates per subject and genre, straight from the counters"""
+    query = {}
+    if subject:
+        query["subject"] = subject
+    if music_genre:
+        query["music_genre"] = music_genre.lower()
+    return [_summary_row(doc) for doc in db.practice_stats.find(query, {"_id": 0}).sort("subject", 1)]
+
+
+def get_missed_blanks(subject: str = None, limit: int = 10) -> list:
+    """Words students miss most, optionally within one subject"""
+    query = {"subject": subject} if subject else {}
+    cursor = db.blank_misses.find(query, {"_id": 0, "updated_at": 0}).sort("misses", -1).limit(limit)
+    return list(cursor)
+
+
+def backfill() -> dict:
+    """Rebuild the counters from every session with an aggregation pipeline.
+
+    Saves that land while this runs may be counted twice or lost for the affected
+    groups, so run it when practice traffic is quiet.
+
+    It is also the repair path for the live counters: record_progress runs after the
+    session write with no compensation, so if one of its $inc updates fails the
+    counters stay off until the next backfill.
+    """
+    now = datetime.now()
+    # Archived stubs keep their practice fields, so they are counted too
+    practiced = {"practice_progress.last_practiced": {"$ne": None}}
+
+    db.sessions.aggregate([
+        {"$match": practiced},
+        {"$group": {
+            "_id": {"subject": "$subject", "music_genre": {"$toLower": {"$ifNull": ["$music_genre", ""]}}},
+            "sessions_practiced": {"$sum": 1},
+            "sessions_completed": {"$sum": {"$cond": [{"$gte": ["$practice_progress.completion_rate", 100]}, 1, 0]}},
+            "completed_blanks": {"$sum": "$practice_progress.completed_blanks"},
+            "total_blanks": {"$sum": "$practice_progress.total_blanks"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "subject": "$_id.subject",
+            "music_genre": "$_id.music_genre",
+            "sessions_practiced": 1,
+            "sessions_completed": 1,
+            "completed_blanks": 1,
+            "total_blanks": 1,
+            # Individual saves were never recorded before analytics existed
+            "saves": "$sessions_practiced",
+            "updated_at": now
+        }},
+        {"$merge": {"into": "practice_stats", "on": ["subject", "music_genre"], "whenMatched": "replace"}}
+    ])
+
+    db.sessions.aggregate([
+        {"$match": {**practiced, "practice_missed_words.0": {"$exists": True}}},
+        {"$unwind": "$practice_missed_words"},
+        {"$group": {
+            "_id": {"subject": "$subject", "word": {"$toLower": "$practice_missed_words"}},
+            "sessions": {"$addToSet": "$session_id"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "subject": "$_id.subject",
+            "word": "$_id.word",
+            "misses": {"$size": "$sessions"},
+            "updated_at": now
+        }},
+        {"$merge": {"into": "blank_misses", "on": ["subject", "word"], "whenMatched": "replace"}}
+    ])
+
+    return {
+        "groups": db.practice_stats.count_documents({}),
+        "missed_words": db.blank_misses.count_documents({}),
+        "rebuilt_at": now.isoformat()
+    }
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from backend.app import audio_io
+from backend.app.config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, AUDIO_CACHE_PINNED
+
+# Read-through disk cache for session audio.
+#
+# Audio files are content-addressed (objects/<sha256>.mp3) and each session gets a
+# symlink (sessions/<session_id>.mp3) pointing at its object, so a cached session can
+# be served straight from disk without looking anything up in MongoDB.
+
+OBJECTS_DIR = os.path.join(AUDIO_CACHE_DIR, "objects")
+SESSIONS_DIR = os.path.join(AUDIO_CACHE_DIR, "sessions")
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # sha256 -> size in bytes, least recently used first
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, f"{digest}.mp3")
+
+
+def _session_path(session_id: str) -> str:
+    # Session ids are uuids, but never let one escape the cache directory
+    safe_id = os.path.basename(session_id)
+    return os.path.join(SESSIONS_DIR, f"{safe_id}.mp3")
+
+
+def _load_index():
+    """Rebuild the LRU index from whatever is already on disk"""
+    global _total_bytes
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+
+    found = []
+    for name in os.listdir(OBJECTS_DIR):
+        if not name.endswith(".mp3"):
+            continue
+        stat = os.stat(os.path.join(OBJECTS_DIR, name))
+        found.append((stat.st_mtime, name[:-4], stat.st_size))
+
+    for _, digest, size in sorted(found):
+        _entries[digest] = size
+        _total_bytes += size
+
+
+def _pinned_digests() -> set:
+    pinned = set()
+    for session_id in AUDIO_CACHE_PINNED:
+        target = _session_path(session_id)
+        if os.path.islink(target):
+            pinned.add(os.path.basename(os.readlink(target))[:-4])
+    return pinned
+
+
+def _evict_locked() -> set:
+    """Drop least recently used objects until we are back under the size cap. Returns the evicted digests."""
+    global _total_bytes
+    evicted = set()
+    if _total_bytes <= AUDIO_CACHE_MAX_BYTES:
+        return evicted
+
+    pinned = _pinned_digests()
+    for digest in list(_entries):
+        if _total_bytes <= AUDIO_CACHE_MAX_BYTES:
+            break
+        if digest in pinned:
+            continue
+        size = _entries.pop(digest)
+        _total_bytes -= size
+        _stats["evictions"] += 1
+        evicted.add(digest)
+        try:
+            os.unlink(_object_path(digest))
+        except FileNotFoundError:
+            pass
+    return evicted
+
+
+def _remove_dangling_links(evicted: set):
+    """Remove session links to evicted objects - run outside the lock, it scans the sessions directory"""
+    if not evicted:
+        return
+    for entry in os.scandir(SESSIONS_DIR):
+        if not entry.is_symlink():
+            continue
+        digest = os.path.basename(os.readlink(entry.path))[:-4]
+        # The object may have been cached again since; only drop links that still dangle
+        if digest in evicted and not os.path.exists(entry.path):
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def get_cached_path(session_id: str):
+    """Return the on-disk path for a session's audio, or None on a cache miss"""
+    link = _session_path(session_id)
+    with _lock:
+        if not os.path.exists(link):  # follows the symlink, so dangling links miss
+            _stats["misses"] += 1
+            return None
+        digest = os.path.basename(os.readlink(link))[:-4]
+        if digest in _entries:
+            _entries.move_to_end(digest)
+        _stats["hits"] += 1
+    return link
+
+
+def _link_session_locked(session_id: str, digest: str) -> str:
+    link = _session_path(session_id)
+    temp_link = f"{link}.{threading.get_ident()}.tmp"
+    os.symlink(os.path.join("..", "objects", f"{digest}.mp3"), temp_link)
+    os.replace(temp_link, link)
+    return link
+
+
+def _adopt(session_id: str, digest: str, temp_path: str, size: int) -> str:
+    """Index a staged object (already inside OBJECTS_DIR) and link the session to it.
+
+    Only this renames and updates the index under the lock; the slow file I/O happens
+    before, so cache hits never wait on a write.
+    """
+    global _total_bytes
+    with _lock:
+        if digest in _entries:
+            duplicate = temp_path
+        else:
+            duplicate = None
+            os.replace(temp_path, _object_path(digest))
+            _entries[digest] = size
+            _total_bytes += size
+        _entries.move_to_end(digest)
+
+        link = _link_session_locked(session_id, digest)
+        evicted = _evict_locked()
+
+    if duplicate:
+        os.unlink(duplicate)
+    _remove_dangling_links(evicted)
+    return link
+
+
+def put_audio(session_id: str, audio_data: bytes) -> str:
+    """Store audio for a session and return the path to serve it from"""
+    digest = hashlib.sha256(audio_data).hexdigest()
+    # Write to a temp file first so readers never see a partial object
+    fd, temp_path = tempfile.mkstemp(dir=OBJECTS_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as temp_file:
+        temp_file.write(audio_data)
+    return _adopt(session_id, digest, temp_path, len(audio_data))
+
+
+def put_audio_file(session_id: str, audio_path: str) -> str:
+    """Adopt an audio file already on disk (e.g. a provider download) without reading it into memory.
+
+    The file is moved into the cache, so audio_path no longer exists afterwards.
+    """
+    digest = audio_io.hash_file(audio_path)
+    size = os.path.getsize(audio_path)
+    # Stage inside the cache dir so the final rename is atomic even across filesystems
+    fd, temp_path = tempfile.mkstemp(dir=OBJECTS_DIR, suffix=".part")
+    os.close(fd)
+    shutil.move(audio_path, temp_path)
+    return _adopt(session_id, digest, temp_path, size)
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "objects": len(_entries),
+            "total_bytes": _total_bytes,
+            "max_bytes": AUDIO_CACHE_MAX_BYTES
+        }
+
+
+_load_index()
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import tempfile
+import time
+import requests
+
+# Audio moves through the generation pipeline as a file on disk rather than as
+# Python bytes: the provider response is streamed into a temp file, Whisper reads
+# that file, the disk cache adopts it, and GridFS uploads it chunk by chunk
+# (see audio_store.py). No step holds the whole song in memory.
+
+CHUNK_SIZE = 64 * 1024
+
+
+def download_to_tempfile(url: str, headers: dict, payload: dict, suffix: str = ".mp3", deadline: float = None, on_chunk=None) -> str:
+    """POST to a provider and stream the response body into a temp file, returning its path.
+
+    deadline bounds the whole download in seconds, not just each socket read.
+    on_chunk(path, bytes_written) is called after each chunk is flushed, for live listeners.
+    """
+    started = time.monotonic()
+    response = requests.post(url, headers=headers, json=payload, stream=True, timeout=deadline)
+
+    if not response.ok:
+        print(f"Provider error from {url}: {response.status_code}")
+        print(f"Response: {response.text}")
+        response.raise_for_status()
+
+    fd, temp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            bytes_written = 0
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    temp_file.write(chunk)
+                    bytes_written += len(chunk)
+                    if on_chunk:
+                        temp_file.flush()
+                        on_chunk(temp_path, bytes_written)
+                if deadline and time.monotonic() - started > deadline:
+                    raise TimeoutError(f"download from {url} exceeded {deadline:.0f}s")
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    finally:
+        response.close()
+
+    return temp_path
+
+
+def hash_file(audio_path: str) -> str:
+    """sha256 of a file, computed in chunks so the file is never fully in memory"""
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as audio_file:
+        for chunk in iter(lambda: audio_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def discard(audio_path: str):
+    """Remove a temp audio file if it is still around"""
+    try:
+        os.unlink(audio_path)
+    except FileNotFoundError:
+        pass
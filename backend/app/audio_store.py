@@ -0,0 +1,86 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+import gridfs
+from bson import ObjectId
+from backend.app import audio_cache
+from backend.app.database import db
+
+# Durable storage for session audio.
+#
+# Songs live in GridFS (fs.files / fs.chunks) and the session document only carries
+# `audio_file_id`. Uploads read the composed temp file in GridFS-sized chunks and
+# downloads write into a temp file for the disk cache, so a song is never held in
+# memory as one buffer. Sessions stored before this carry the song inline as
+# `audio_data`; those are still served, and are moved to GridFS when they come back
+# from the archive (see retention.py).
+
+CHUNK_SIZE = 255 * 1024  # GridFS default chunk size
+# Files no session points at are left alone this long, so an upload whose session
+# insert is still in flight is not collected
+ORPHAN_GRACE_HOURS = 24
+
+_fs = gridfs.GridFS(db)
+
+
+def put_file(audio_path: str) -> str:
+    """Upload an audio file to GridFS chunk by chunk and return its id for the session document"""
+    with open(audio_path, "rb") as audio_file:
+        file_id = _fs.put(audio_file, filename=os.path.basename(audio_path), chunk_size=CHUNK_SIZE)
+    return str(file_id)
+
+
+def put_bytes(audio_data: bytes) -> str:
+    """Upload audio that is already in memory (e.g. a restored archive)"""
+    return str(_fs.put(audio_data, chunk_size=CHUNK_SIZE))
+
+
+def read_bytes(file_id: str) -> bytes:
+    return _fs.get(ObjectId(file_id)).read()
+
+
+def get_length(file_id: str) -> int:
+    grid_file = db.fs.files.find_one({"_id": ObjectId(file_id)}, {"length": 1})
+    return grid_file["length"] if grid_file else 0
+
+
+def delete(file_id: str):
+    _fs.delete(ObjectId(file_id))
+
+
+def cache_session_audio(session_id: str, session_doc: dict):
+    """Fill the disk cache with a session's stored audio and return its path, or None while audio is pending.
+
+    session_doc needs audio_file_id (and audio_data, for sessions stored before GridFS).
+    """
+    file_id = session_doc.get("audio_file_id")
+    if not file_id:
+        audio_data = session_doc.get("audio_data")
+        return audio_cache.put_audio(session_id, audio_data) if audio_data else None
+
+    try:
+        grid_out = _fs.get(ObjectId(file_id))
+    except gridfs.NoFile:
+        print(f"⚠️  Audio file {file_id} missing for session {session_id}")
+        return None
+
+    fd, temp_path = tempfile.mkstemp(suffix=".mp3")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            for chunk in grid_out:
+                temp_file.write(chunk)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return audio_cache.put_audio_file(session_id, temp_path)
+
+
+def delete_orphans() -> int:
+    """Delete GridFS audio no session refers to any more (expired by the abandon TTL, or a failed insert)"""
+    cutoff = datetime.utcnow() - timedelta(hours=ORPHAN_GRACE_HOURS)
+    deleted = 0
+    for grid_file in db.fs.files.find({"uploadDate": {"$lt": cutoff}}, {"_id": 1}):
+        if not db.sessions.find_one({"audio_file_id": str(grid_file["_id"])}, {"_id": 1}):
+            _fs.delete(grid_file["_id"])
+            deleted += 1
+    return deleted
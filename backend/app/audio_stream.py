@@ -0,0 +1,150 @@
+import asyncio
+import os
+import threading
+from starlette.concurrency import run_in_threadpool
+from backend.app.config import ELEVENLABS_PLAN_DEADLINE_SECONDS, ELEVENLABS_COMPOSE_DEADLINE_SECONDS
+
+# Songs that are still being composed, so listeners can play them while they download.
+#
+# The composing thread streams the ElevenLabs response into a temp file and reports
+# progress here after every chunk. Readers are async generators: they wait on the event
+# loop (no threadpool thread per listener) and pread() from their own duplicate of the
+# file descriptor, so they keep working after the file is renamed into the audio cache.
+# Readers that start after that read the cached file instead. Nothing is buffered in
+# memory beyond one chunk per reader.
+
+CHUNK_SIZE = 64 * 1024
+# Plan creation and the whole compose can pass before the next byte arrives
+READ_TIMEOUT_SECONDS = ELEVENLABS_PLAN_DEADLINE_SECONDS + ELEVENLABS_COMPOSE_DEADLINE_SECONDS
+
+_lock = threading.Lock()
+_live = {}  # session_id -> LiveAudio
+
+
+class LiveAudioError(Exception):
+    """Raised inside a reader when the composition fails or stalls, aborting the response"""
+
+
+class LiveAudio:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.size = 0
+        self.done = False
+        self.error = None
+        self.final_path = None  # Where the finished song lives once it is in the audio cache
+        self._fd = None  # Only used to hand out duplicates; readers never read through it
+        self._lock = threading.Lock()
+        self._waiters = set()  # (loop, asyncio.Event) for each reader waiting on the writer
+
+    def _notify_locked(self):
+        for loop, event in self._waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed (shutdown)
+
+    def progress(self, path: str, size: int):
+        """Called by the writer after each chunk has been flushed to path"""
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(path, os.O_RDONLY)
+            self.size = size
+            self._notify_locked()
+
+    def finish(self, error: str = None, final_path: str = None):
+        """Called by the writer once the song is stored at final_path (or the composition failed)"""
+        with self._lock:
+            self.done = True
+            self.error = error
+            self.final_path = final_path
+            self._notify_locked()
+
+    def release(self):
+        """No new readers will duplicate the descriptor from here on - they read final_path"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def open_reader(self):
+        """Return an async iterator over the song's bytes, or None if there is nothing to stream"""
+        with self._lock:
+            if self.error is not None or (self.done and self._fd is None and not self.final_path):
+                return None
+        # Nothing is acquired until iteration starts, so a reader that is never iterated holds nothing
+        return self._iter_bytes()
+
+    async def _iter_bytes(self):
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        offset = 0
+        fd = None
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while True:
+                with self._lock:
+                    event.clear()
+                    if fd is None and self._fd is not None:
+                        fd = os.dup(self._fd)
+                    size, done, error, final_path = self.size, self.done, self.error, self.final_path
+
+                if error is not None:
+                    raise LiveAudioError(f"Composition failed for {self.session_id}: {error}")
+                if fd is None and done:
+                    if not final_path:
+                        raise LiveAudioError(f"No audio was composed for {self.session_id}")
+                    # Started after the stream was handed over to the audio cache
+                    fd = os.open(final_path, os.O_RDONLY)
+                    size = os.fstat(fd).st_size
+
+                if fd is not None and offset < size:
+                    chunk = await run_in_threadpool(os.pread, fd, min(CHUNK_SIZE, size - offset), offset)
+                    if not chunk:
+                        raise LiveAudioError(f"Audio for {self.session_id} ended early")
+                    offset += len(chunk)
+                    yield chunk
+                    continue
+                if done:
+                    return
+
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=READ_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    raise LiveAudioError(f"Composition stalled for {self.session_id}")
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+            if fd is not None:
+                os.close(fd)
+
+
+def register(session_id: str) -> LiveAudio:
+    with _lock:
+        live = LiveAudio(session_id)
+        _live[session_id] = live
+        return live
+
+
+def claim(session_id: str):
+    """Return (live, True) after registering a new composition, or (live, False) if one is already running"""
+    with _lock:
+        live = _live.get(session_id)
+        if live:
+            return live, False
+        live = LiveAudio(session_id)
+        _live[session_id] = live
+        return live, True
+
+
+def get(session_id: str):
+    with _lock:
+        return _live.get(session_id)
+
+
+def unregister(session_id: str):
+    """Stop routing new listeners to the live stream - call once the song is stored"""
+    with _lock:
+        live = _live.pop(session_id, None)
+    if live:
+        live.release()
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from backend.app import audio_cache, audio_store
+from backend.app.database import db
+from backend.app.retention import find_session
+from backend.app.config import BUNDLE_CACHE_DIR, BUNDLE_CACHE_MAX_BYTES
+
+# Packed offline bundles of practice sessions, so a device (or a classroom proxy) can
+# prefetch a whole unit with one request instead of a session + audio call per song.
+#
+# A bundle is a zip:
+#   manifest.json               format version plus each session's content hashes, in request order
+#   <session_id>/session.json   metadata, lyrics, blanks and word timings
+#   <session_id>/audio.mp3      the song, once it has been composed
+#   <session_id>/waveform.bin   packed waveform (format in waveform.py), once analyzed
+#
+# The bundle is named by the sha256 of its manifest, so the same sessions in the same
+# state always map to the same file. It is built once into BUNDLE_CACHE_DIR and served
+# from there as an immutable object; a session that changes (re-blanked, audio composed)
+# hashes to a new bundle and the old one ages out of the size-capped cache.
+
+VERSION = 1
+
+# What describes the song itself - practice progress and bookkeeping change too often to bundle
+SESSION_FIELDS = (
+    "session_id", "subject", "concepts", "music_genre", "notes",
+    "lyrics", "practiced_lyrics", "blanks", "word_timings", "created_at"
+)
+
+_lock = threading.Lock()
+_building = {}  # digest -> lock held while that bundle is being built
+_stats = {"hits": 0, "builds": 0, "evictions": 0}
+
+
+class SessionsNotFound(Exception):
+    """Raised when some of the requested sessions do not exist"""
+
+    def __init__(self, session_ids: list):
+        super().__init__(f"Sessions not found: {', '.join(session_ids)}")
+        self.session_ids = session_ids
+
+
+def _bundle_path(digest: str) -> str:
+    return os.path.join(BUNDLE_CACHE_DIR, f"{digest}.zip")
+
+
+def _load_sessions(session_ids: list) -> dict:
+    """One query for every session's metadata, restoring any that have been archived"""
+    projection = {"_id": 0, "archived": 1, "waveform": 1, **{field: 1 for field in SESSION_FIELDS}}
+    docs = {doc["session_id"]: doc for doc in db.sessions.find({"session_id": {"$in": session_ids}}, projection)}
+    for session_id, doc in list(docs.items()):
+        if doc.get("archived"):
+            restored = find_session(session_id, projection)
+            if restored:
+                docs[session_id] = restored
+            else:
+                del docs[session_id]
+    return docs
+
+
+def _open_audio(session_id: str):
+    """Open a session's audio object from the disk cache, filling it from MongoDB if needed.
+
+    Returns (file, sha256), or (None, None) while audio is pending. The open file stays
+    readable even if the cache evicts the object before the bundle is written.
+    """
+    for _ in range(2):
+        link = audio_cache.get_cached_path(session_id)
+        if not link:
+            session_doc = find_session(session_id, {"audio_file_id": 1, "audio_data": 1})
+            link = audio_store.cache_session_audio(session_id, session_doc) if session_doc else None
+        if not link:
+            return None, None
+        # Resolve the link once so the hash and the bytes come from the same object
+        object_path = os.path.realpath(link)
+        try:
+            audio_file = open(object_path, "rb")
+        except FileNotFoundError:
+            continue  # Evicted in between - load it again
+        return audio_file, os.path.basename(object_path)[:-len(".mp3")]
+    raise FileNotFoundError(f"Audio for {session_id} keeps getting evicted from the cache")
+
+
+def _close_parts(parts: list):
+    for part in parts:
+        if part["audio_file"]:
+            part["audio_file"].close()
+
+
+def _prepare(session_ids: list):
+    """Gather each session's parts and the manifest that names the bundle"""
+    docs = _load_sessions(session_ids)
+    missing = [session_id for session_id in session_ids if session_id not in docs]
+    if missing:
+        raise SessionsNotFound(missing)
+
+    parts = []
+    entries = []
+    try:
+        for session_id in session_ids:
+            doc = docs[session_id]
+            metadata = {field: doc[field] for field in SESSION_FIELDS if field in doc}
+            metadata_json = json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")
+            waveform = bytes(doc["waveform"]) if doc.get("waveform") else None
+            # The cache names audio objects by their sha256, so this doesn't read the file
+            audio_file, audio_sha256 = _open_audio(session_id)
+
+            parts.append({"session_id": session_id, "metadata": metadata_json, "waveform": waveform, "audio_file": audio_file})
+            entries.append({
+                "session_id": session_id,
+                "session_sha256": hashlib.sha256(metadata_json).hexdigest(),
+                "audio_sha256": audio_sha256,
+                "waveform_sha256": hashlib.sha256(waveform).hexdigest() if waveform else None
+            })
+    except BaseException:
+        _close_parts(parts)
+        raise
+
+    manifest = json.dumps({"version": VERSION, "sessions": entries}, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(manifest).hexdigest(), manifest, parts
+
+
+def _write_bundle(path: str, manifest: bytes, parts: list):
+    # MP3 is already compressed, so only the JSON is deflated
+    fd, temp_path = tempfile.mkstemp(dir=BUNDLE_CACHE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as temp_file, zipfile.ZipFile(temp_file, "w", zipfile.ZIP_STORED) as bundle:
+            bundle.writestr("manifest.json", manifest, compress_type=zipfile.ZIP_DEFLATED)
+            for part in parts:
+                session_id = part["session_id"]
+                bundle.writestr(f"{session_id}/session.json", part["metadata"], compress_type=zipfile.ZIP_DEFLATED)
+                if part["waveform"]:
+                    bundle.writestr(f"{session_id}/waveform.bin", part["waveform"])
+                if part["audio_file"]:
+                    with bundle.open(f"{session_id}/audio.mp3", "w") as entry:
+                        shutil.copyfileobj(part["audio_file"], entry)
+        # Readers never see a partial bundle
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _evict_locked(keep: str):
+    """Drop least recently served bundles until the cache is back under its size cap"""
+    bundles = []
+    for name in os.listdir(BUNDLE_CACHE_DIR):
+        if name.endswith(".zip"):
+            stat = os.stat(os.path.join(BUNDLE_CACHE_DIR, name))
+            bundles.append((stat.st_mtime, name, stat.st_size))
+
+    total_bytes = sum(size for _, _, size in bundles)
+    for _, name, size in sorted(bundles):
+        if total_bytes <= BUNDLE_CACHE_MAX_BYTES:
+            break
+        if name == keep:
+            continue
+        try:
+            os.unlink(os.path.join(BUNDLE_CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        _stats["evictions"] += 1
+
+
+def get_bundle(session_ids: list) -> str:
+    """Return the content hash of the bundle for these sessions, building it if it isn't cached yet"""
+    digest, manifest, parts = _prepare(session_ids)
+    path = _bundle_path(digest)
+    try:
+        if _touch_if_built(path):
+            return digest
+
+        # Builds run outside the global lock; only requests for the same bundle wait on each other
+        with _lock:
+            build_lock = _building.setdefault(digest, threading.Lock())
+        with build_lock:
+            try:
+                if _touch_if_built(path):
+                    return digest
+                os.makedirs(BUNDLE_CACHE_DIR, exist_ok=True)
+                _write_bundle(path, manifest, parts)
+            finally:
+                with _lock:
+                    _building.pop(digest, None)
+            with _lock:
+                _stats["builds"] += 1
+                _evict_locked(keep=os.path.basename(path))
+        return digest
+    finally:
+        _close_parts(parts)
+
+
+def _touch_if_built(path: str) -> bool:
+    try:
+        os.utime(path)  # Marks it recently served for eviction
+    except FileNotFoundError:
+        return False
+    with _lock:
+        _stats["hits"] += 1
+    return True
+
+
+def get_cached_path(digest: str):
+    """Path of an already built bundle, or None"""
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        return None
+    path = _bundle_path(digest)
+    return path if os.path.exists(path) else None
+
+
+def get_stats() -> dict:
+    with _lock:
+        names = [name for name in os.listdir(BUNDLE_CACHE_DIR) if name.endswith(".zip")] if os.path.isdir(BUNDLE_CACHE_DIR) else []
+        return {
+            **_stats,
+            "bundles": len(names),
+            "total_bytes": sum(os.path.getsize(os.path.join(BUNDLE_CACHE_DIR, name)) for name in names),
+            "max_bytes": BUNDLE_CACHE_MAX_BYTES
+        }
@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from backend.app.config import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_SECONDS,
+    GEMINI_DEADLINE_SECONDS,
+    ELEVENLABS_PLAN_DEADLINE_SECONDS,
+    ELEVENLABS_COMPOSE_DEADLINE_SECONDS
+)
+
+# Per-provider circuit breakers.
+#
+# A breaker opens after BREAKER_FAILURE_THRESHOLD consecutive failures, where a call
+# that errors or blows its latency budget counts as a failure. While open, calls fail
+# immediately with ProviderUnavailable so the pipeline can degrade instead of waiting.
+# After BREAKER_RESET_SECONDS one trial call is let through (half-open); success closes
+# the breaker again.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Calls that need a hard deadline (the Gemini SDK has no per-call timeout) run here,
+# so a slow provider ties up a pool thread instead of the request
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="provider-call")
+
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider's breaker is open or a call missed its deadline"""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} unavailable: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, latency_budget: float, use_deadline: bool = False):
+        self.name = name
+        self.latency_budget = latency_budget  # SLO in seconds, slower calls count as failures
+        self.use_deadline = use_deadline  # Abandon calls that run past the budget
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0}
+        self._lock = threading.Lock()
+        self._trial_in_flight = False
+
+    def _allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= BREAKER_RESET_SECONDS:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def _record(self, success: bool, error: str = None):
+        with self._lock:
+            self.stats["calls"] += 1
+            self._trial_in_flight = False
+            if success:
+                self.stats["successes"] += 1
+                self.consecutive_failures = 0
+                self.state = CLOSED
+                self.opened_at = None
+                return
+
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+                if self.state != OPEN:
+                    print(f"🔌 {self.name} breaker opened: {error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker, raising ProviderUnavailable instead of waiting on a bad provider"""
+        if not self._allow():
+            raise ProviderUnavailable(self.name, "circuit open")
+
+        started = time.monotonic()
+        try:
+            if self.use_deadline:
+                future = _executor.submit(fn, *args, **kwargs)
+                try:
+                    result = future.result(timeout=self.latency_budget)
+                except FutureTimeout:
+                    raise ProviderUnavailable(self.name, f"no response within {self.latency_budget:g}s")
+            else:
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record(False, str(e))
+            if isinstance(e, ProviderUnavailable):
+                raise
+            raise ProviderUnavailable(self.name, str(e)) from e
+
+        elapsed = time.monotonic() - started
+        if elapsed > self.latency_budget:
+            # The call worked, so use its result - but a provider this slow should trip the breaker
+            with self._lock:
+                self.stats["slow_calls"] += 1
+            self._record(False, f"slow call ({elapsed:.1f}s > {self.latency_budget:g}s budget)")
+        else:
+            self._record(True)
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, BREAKER_RESET_SECONDS - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "latency_budget_seconds": self.latency_budget,
+                "retry_in_seconds": retry_in,
+                "last_error": self.last_error,
+                **self.stats
+            }
+
+
+breakers = {
+    "gemini": CircuitBreaker("gemini", GEMINI_DEADLINE_SECONDS, use_deadline=True),
+    "elevenlabs_plan": CircuitBreaker("elevenlabs_plan", ELEVENLABS_PLAN_DEADLINE_SECONDS),
+    "elevenlabs_compose": CircuitBreaker("elevenlabs_compose", ELEVENLABS_COMPOSE_DEADLINE_SECONDS)
+}
+
+
+def get_breaker_states() -> dict:
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
@@ -7,3 +7,53 @@ MONGO_URI = os.getenv("MONGO_URI")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
+
+# Local disk cache for session audio (served with file responses instead of Mongo reads)
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", ".audio_cache")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Comma-separated session ids (e.g. the demo songs) that are never evicted
+# Defaults to the demo sessions in DEMO_SESSION_MAP (app.js)
+AUDIO_CACHE_PINNED = [s.strip() for s in os.getenv(
+    "AUDIO_CACHE_PINNED",
+    "bee9c77c-f762-4224-98f1-ee3c7d996372,a31bbfb6-4c03-4634-ac5a-39e5c2176ff6,e193f5d7-8e4b-4fb9-a6d1-5744c70f0774"
+).split(",") if s.strip()]
+
+# Provider circuit breakers: latency budgets (seconds) and trip/reset behaviour
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "20"))
+ELEVENLABS_PLAN_DEADLINE_SECONDS = float(os.getenv("ELEVENLABS_PLAN_DEADLINE_SECONDS", "15"))
+ELEVENLABS_COMPOSE_DEADLINE_SECONDS = float(os.getenv("ELEVENLABS_COMPOSE_DEADLINE_SECONDS", "120"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Session retention: TTL for never-practiced sessions, archival of idle ones
+SESSION_ABANDON_DAYS = float(os.getenv("SESSION_ABANDON_DAYS", "14"))
+SESSION_ARCHIVE_AFTER_DAYS = float(os.getenv("SESSION_ARCHIVE_AFTER_DAYS", "30"))
+SESSION_ARCHIVE_DIR = os.getenv("SESSION_ARCHIVE_DIR", ".session_archive")
+RETENTION_SWEEP_HOURS = float(os.getenv("RETENTION_SWEEP_HOURS", "6"))
+
+# Shared secret for /api/admin endpoints (sent as the X-Admin-Token header); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Request tracing (ring buffer of span trees) and sampled CPU profiling
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "500"))
+TRACE_FILE = os.getenv("TRACE_FILE")  # Optional JSON-lines file of finished traces
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # Oldest profiles are deleted beyond this
+
+# Composition plan templates from ElevenLabs, cached per genre
+PLAN_CACHE_TTL_HOURS = float(os.getenv("PLAN_CACHE_TTL_HOURS", str(7 * 24)))
+PLAN_CACHE_WARM_GENRES = [g.strip() for g in os.getenv("PLAN_CACHE_WARM_GENRES", "pop,rap,r&b").split(",") if g.strip()]
+
+# How often practice answers streamed over the WebSocket are written to MongoDB
+PRACTICE_FLUSH_SECONDS = float(os.getenv("PRACTICE_FLUSH_SECONDS", "2"))
+
+# Memoized Gemini responses for stable prompts (blank selection); evicted when unused this long
+LLM_MEMO_TTL_DAYS = float(os.getenv("LLM_MEMO_TTL_DAYS", "30"))
+LLM_MEMO_MEMORY_ENTRIES = int(os.getenv("LLM_MEMO_MEMORY_ENTRIES", "256"))
+
+# Packed offline session bundles (/api/bundle), cached on disk by content hash
+BUNDLE_CACHE_DIR = os.getenv("BUNDLE_CACHE_DIR", ".bundle_cache")
+BUNDLE_CACHE_MAX_BYTES = int(os.getenv("BUNDLE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+BUNDLE_MAX_SESSIONS = int(os.getenv("BUNDLE_MAX_SESSIONS", "50"))
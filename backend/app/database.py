@@ -1,8 +1,21 @@
 from pymongo.mongo_client import MongoClient
+from pymongo.errors import OperationFailure
 from pymongo.server_api import ServerApi
 from backend.app.config import MONGO_URI
+from backend.app.tracing import MongoSpanListener
 
 # Create a new client and connect to the server
-client = MongoClient(MONGO_URI, server_api=ServerApi('1'))
+client = MongoClient(MONGO_URI, server_api=ServerApi('1'), event_listeners=[MongoSpanListener()])
 
-db = client["memo_music"]
\ No newline at end of file
+db = client["memo_music"]
+
+
+def ensure_ttl_index(collection, field: str, expire_seconds: int):
+    """Create a TTL index, or update its expiry in place if it already exists with a different one"""
+    try:
+        collection.create_index(field, expireAfterSeconds=expire_seconds)
+    except OperationFailure:
+        db.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": expire_seconds}
+        )
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from backend.app.database import db, ensure_ttl_index
+from backend.app.config import LLM_MEMO_TTL_DAYS, LLM_MEMO_MEMORY_ENTRIES
+
+# Durable memo of LLM responses, keyed by model name + sha256 of the prompt.
+#
+# Only for prompts built entirely from stable inputs (e.g. blank selection), where the
+# same prompt should give the same answer; callers opt in per call. Responses live in an
+# in-process LRU in front of the llm_memo collection, whose TTL index on last_used_at
+# evicts entries nobody has asked for in LLM_MEMO_TTL_DAYS. Hits served from memory
+# still bump last_used_at, at most once per TOUCH_INTERVAL per entry, so the hottest
+# entries don't expire from the collection just because they never leave the LRU.
+
+TOUCH_INTERVAL = timedelta(hours=1)
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # key -> [response, when last_used_at was last written], least recently used first
+_stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "stores": 0}
+
+
+def _key(model: str, prompt: str) -> str:
+    return f"{model}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+
+def _remember(key: str, response: str, touched_at: datetime):
+    # Caller holds _lock
+    _memory[key] = [response, touched_at]
+    _memory.move_to_end(key)
+    while len(_memory) > LLM_MEMO_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def ensure_indexes():
+    db.llm_memo.create_index("key", unique=True)
+    ensure_ttl_index(db.llm_memo, "last_used_at", int(LLM_MEMO_TTL_DAYS * 24 * 60 * 60))
+
+
+def get(model: str, prompt: str):
+    """Stored response for this model and prompt, or None"""
+    key = _key(model, prompt)
+    now = datetime.now()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            response, touched_at = entry
+            touch = now - touched_at >= TOUCH_INTERVAL
+            if touch:
+                entry[1] = now
+    if entry is not None:
+        if touch:
+            db.llm_memo.update_one({"key": key}, {"$set": {"last_used_at": now}})
+        return response
+
+    doc = db.llm_memo.find_one_and_update(
+        {"key": key},
+        {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+        projection={"response": 1}
+    )
+    with _lock:
+        if doc is None:
+            _stats["misses"] += 1
+            return None
+        _stats["store_hits"] += 1
+        _remember(key, doc["response"], now)
+    return doc["response"]
+
+
+def put(model: str, prompt: str, response: str):
+    key = _key(model, prompt)
+    now = datetime.now()
+    with _lock:
+        _remember(key, response, now)
+        _stats["stores"] += 1
+    db.llm_memo.update_one(
+        {"key": key},
+        {
+            "$set": {"model": model, "response": response, "last_used_at": now},
+            "$setOnInsert": {"created_at": now, "hits": 0}
+        },
+        upsert=True
+    )
+
+
+def forget(model: str, prompt: str):
+    """Drop one entry, e.g. when the stored response turned out to be unusable"""
+    key = _key(model, prompt)
+    with _lock:
+        _memory.pop(key, None)
+    db.llm_memo.delete_one({"key": key})
+
+
+def clear() -> int:
+    """Drop every stored response. Only this process's LRU is emptied - other workers keep
+    serving theirs until those entries are evicted or the workers restart."""
+    with _lock:
+        _memory.clear()
+    return db.llm_memo.delete_many({}).deleted_count
+
+
+def get_stats() -> dict:
+    with _lock:
+        lookups = _stats["memory_hits"] + _stats["store_hits"] + _stats["misses"]
+        hits = _stats["memory_hits"] + _stats["store_hits"]
+        return {
+            **_stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0,
+            "memory_entries": len(_memory),
+            "ttl_days": LLM_MEMO_TTL_DAYS
+        }
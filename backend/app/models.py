@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -13,6 +13,7 @@ class Frontend(BaseModel):
     music_genre: str
     notes: str
     grade_level: str = "high school"
+    stream_audio: bool = False  # Return right away and stream the song from audio_url while it is composed
 
 class Gemini(BaseModel):
     string: str
@@ -28,11 +29,24 @@ class Blank(BaseModel):
     is_correct: bool = False  # Whether user has answered correctly
     user_answer: str = ""  # User's current answer
 
+class WordTiming(BaseModel):
+    word: str
+    start: float = 0.0  # Start time in seconds for this word
+    end: float = 0.0  # End time in seconds for this word
+
 class ParsedLyrics(BaseModel):
     lyrics: List[str]
     practiced_lyrics: List[str]
     blanks: List[Blank]
 
+class PracticeProgress(BaseModel):
+    session_id: str
+    completed_blanks: int
+    total_blanks: int
+    completion_rate: int
+    last_practiced: str
+    missed_words: List[str] = []  # Blank words answered incorrectly so far, for analytics
+
 class ElevenUrl(BaseModel):
     url: str
 
@@ -45,7 +59,8 @@ class Session(BaseModel):
     lyrics: List[str]
     practiced_lyrics: List[str]
     blanks: List[Blank]
-    audio_data: bytes  # Store audio data directly
+    word_timings: List[WordTiming] = []  # Whisper word timings, reused when re-blanking
+    audio_file_id: Optional[str] = None  # GridFS id of the song (None while composition is deferred)
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,106 @@
+import copy
+import threading
+from datetime import datetime, timedelta
+from backend.app.database import db, ensure_ttl_index
+from backend.app.config import PLAN_CACHE_TTL_HOURS
+
+# Composition plan templates from ElevenLabs /v1/music/plan, keyed by genre and length.
+#
+# The plan prompt only depends on those two values and we overwrite the lyrics anyway,
+# so a template fetched once can be reused for every song in that genre. Templates live
+# in memory and in the plan_templates collection (TTL-indexed) so they survive restarts.
+
+_lock = threading.Lock()
+_templates = {}  # (genre, music_length_ms) -> {"plan": dict, "expires_at": datetime}
+_stats = {"hits": 0, "misses": 0}
+
+
+def _key(music_genre: str, music_length_ms: int) -> tuple:
+    return (music_genre.strip().lower(), int(music_length_ms))
+
+
+def ensure_indexes():
+    db.plan_templates.create_index([("genre", 1), ("music_length_ms", 1)], unique=True)
+    ensure_ttl_index(db.plan_templates, "created_at", int(PLAN_CACHE_TTL_HOURS * 60 * 60))
+
+
+def load():
+    """Pull every stored template into memory"""
+    ttl = timedelta(hours=PLAN_CACHE_TTL_HOURS)
+    now = datetime.now()
+    loaded = 0
+    with _lock:
+        for doc in db.plan_templates.find({}, {"_id": 0}):
+            expires_at = doc["created_at"] + ttl
+            if expires_at > now:
+                _templates[(doc["genre"], doc["music_length_ms"])] = {"plan": doc["plan"], "expires_at": expires_at}
+                loaded += 1
+    print(f"🎼 Loaded {loaded} cached composition plan templates")
+
+
+def get_template(music_genre: str, music_length_ms: int, fetch) -> dict:
+    """Return a private copy of the template for this genre, calling fetch(genre, length) on a miss"""
+    key = _key(music_genre, music_length_ms)
+    with _lock:
+        entry = _templates.get(key)
+        if entry and entry["expires_at"] > datetime.now():
+            _stats["hits"] += 1
+            return copy.deepcopy(entry["plan"])
+        _stats["misses"] += 1
+
+    plan = fetch(music_genre, music_length_ms)
+    store(music_genre, music_length_ms, plan)
+    return copy.deepcopy(plan)
+
+
+def store(music_genre: str, music_length_ms: int, plan: dict):
+    genre, length = _key(music_genre, music_length_ms)
+    now = datetime.now()
+    with _lock:
+        _templates[(genre, length)] = {
+            "plan": copy.deepcopy(plan),
+            "expires_at": now + timedelta(hours=PLAN_CACHE_TTL_HOURS)
+        }
+    db.plan_templates.replace_one(
+        {"genre": genre, "music_length_ms": length},
+        {"genre": genre, "music_length_ms": length, "plan": plan, "created_at": now},
+        upsert=True
+    )
+
+
+def invalidate(music_genre: str = None) -> int:
+    """Drop cached templates for one genre (or all of them). Returns how many were removed."""
+    with _lock:
+        if music_genre is None:
+            removed = len(_templates)
+            _templates.clear()
+            db.plan_templates.delete_many({})
+            return removed
+
+        genre = music_genre.strip().lower()
+        keys = [key for key in _templates if key[0] == genre]
+        for key in keys:
+            del _templates[key]
+    db.plan_templates.delete_many({"genre": genre})
+    return len(keys)
+
+
+def warm(genres: list, music_length_ms: int, fetch):
+    """Fetch templates for commonly used genres in the background so first requests hit the cache"""
+    def run():
+        for genre in genres:
+            try:
+                get_template(genre, music_length_ms, fetch)
+            except Exception as e:
+                print(f"Plan cache warm-up failed for {genre}: {e}")
+
+    threading.Thread(target=run, daemon=True, name="plan-cache-warmup").start()
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "templates": sorted(f"{genre}/{length}ms" for genre, length in _templates),
+            "ttl_hours": PLAN_CACHE_TTL_HOURS
+        }
@@ -0,0 +1,200 @@
+import threading
+import time
+from datetime import datetime, timezone
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from backend.app.models import PracticeProgress
+from backend.app.retention import find_session, find_and_update_session
+from backend.app.config import PRACTICE_FLUSH_SECONDS
+from backend.app import analytics
+
+# Practice progress persistence, plus a WebSocket channel for the practice player.
+#
+# Over the WebSocket the client streams answer events and gets back the validation
+# result and its position in the blank schedule. Progress is not written per answer:
+# each session's latest state is queued and a background flusher writes every
+# PRACTICE_FLUSH_SECONDS, so a classroom of students costs one write per active session
+# per interval rather than one HTTP request and write per answer.
+
+practice_router = APIRouter()
+
+_pending_lock = threading.Lock()
+_pending = {}  # session_id -> latest PracticeProgress not yet written
+# Held from taking a session's queued state until it is written, so an older state can
+# never land after a newer one. Striped so there is no per-session lock to clean up.
+_write_locks = [threading.Lock() for _ in range(64)]
+
+
+def save_progress(progress: PracticeProgress) -> bool:
+    """Write practice progress to the session and update analytics. Returns False if the session is gone."""
+    # Update the session with practice progress, reading back the previous progress for analytics
+    previous = find_and_update_session(
+        progress.session_id,
+        {
+            "$set": {
+                "practice_progress": {
+                    "completed_blanks": progress.completed_blanks,
+                    "total_blanks": progress.total_blanks,
+                    "completion_rate": progress.completion_rate,
+                    "last_practiced": progress.last_practiced
+                },
+                "updated_at": datetime.now()
+            },
+            "$addToSet": {"practice_missed_words": {"$each": progress.missed_words}},
+            # Practiced sessions are no longer candidates for abandonment expiry
+            "$unset": {"abandon_at": ""}
+        },
+        projection={"subject": 1, "music_genre": 1, "practice_progress": 1, "practice_missed_words": 1}
+    )
+
+    if previous is None:
+        return False
+
+    analytics.record_progress(previous, progress, progress.missed_words)
+    return True
+
+
+def queue_progress(progress: PracticeProgress):
+    """Queue progress for the next batched write, keeping missed words from earlier queued states"""
+    with _pending_lock:
+        queued = _pending.get(progress.session_id)
+        if queued:
+            missed = list(dict.fromkeys(queued.missed_words + progress.missed_words))
+            progress = progress.model_copy(update={"missed_words": missed})
+        _pending[progress.session_id] = progress
+
+
+def save_progress_now(progress: PracticeProgress) -> bool:
+    """Write progress immediately (the HTTP save), superseding anything queued for the session.
+
+    Takes the session's write lock like the flusher, and keeps missed words from the queued state.
+    """
+    with _write_locks[hash(progress.session_id) % len(_write_locks)]:
+        with _pending_lock:
+            queued = _pending.pop(progress.session_id, None)
+        if queued:
+            missed = list(dict.fromkeys(queued.missed_words + progress.missed_words))
+            progress = progress.model_copy(update={"missed_words": missed})
+        return save_progress(progress)
+
+
+def flush_progress(session_id: str = None) -> int:
+    """Write queued progress - for one session, or everything. Returns how many sessions were written."""
+    with _pending_lock:
+        session_ids = list(_pending) if session_id is None else [session_id]
+
+    written = 0
+    for queued_id in session_ids:
+        with _write_locks[hash(queued_id) % len(_write_locks)]:
+            with _pending_lock:
+                progress = _pending.pop(queued_id, None)
+            if progress is None:
+                continue
+            try:
+                save_progress(progress)
+                written += 1
+            except Exception as e:
+                print(f"Practice progress flush error for {queued_id}: {e}")
+    return written
+
+
+def start_progress_flusher():
+    def run():
+        while True:
+            time.sleep(PRACTICE_FLUSH_SECONDS)
+            flush_progress()
+
+    threading.Thread(target=run, daemon=True, name="practice-flusher").start()
+
+
+def _schedule_entry(index: int, blank: dict) -> dict:
+    return {
+        "index": index,
+        "line_index": blank["line_index"],
+        "word_position": blank["word_position"],
+        "start_time": blank.get("start_time", 0.0),
+        "end_time": blank.get("end_time", 0.0)
+    }
+
+
+@practice_router.websocket("/ws/practice/{session_id}")
+async def practice_channel(websocket: WebSocket, session_id: str):
+    """Validate answers for one practice session and report position in the blank schedule.
+
+    Client -> server: {"type": "answer", "blank_index": 0, "answer": "stack"}
+    Server -> client: {"type": "schedule", ...} once, then {"type": "result", ...} per answer
+    """
+    await websocket.accept()
+
+    session_doc = await run_in_threadpool(find_session, session_id, {"blanks": 1})
+    if not session_doc:
+        await websocket.send_json({"type": "error", "detail": "Session not found"})
+        await websocket.close(code=4404)
+        return
+
+    # Same order the player uses: chronological by start time
+    blanks = sorted(session_doc.get("blanks", []), key=lambda blank: blank.get("start_time", 0.0))
+    answered = {}  # blank index -> whether the first answer was correct
+    missed_words = []
+
+    await websocket.send_json({
+        "type": "schedule",
+        "total_blanks": len(blanks),
+        "position": 0,
+        "blanks": [_schedule_entry(index, blank) for index, blank in enumerate(blanks)]
+    })
+
+    try:
+        while True:
+            try:
+                event = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Events must be JSON"})
+                continue
+            if not isinstance(event, dict):
+                await websocket.send_json({"type": "error", "detail": "Events must be JSON objects"})
+                continue
+            if event.get("type") != "answer":
+                await websocket.send_json({"type": "error", "detail": "Unknown event type"})
+                continue
+
+            blank_index = event.get("blank_index")
+            if not isinstance(blank_index, int) or not 0 <= blank_index < len(blanks):
+                await websocket.send_json({"type": "error", "detail": "Invalid blank_index"})
+                continue
+
+            correct_answer = blanks[blank_index]["original_word"]
+            correct = str(event.get("answer", "")).strip().lower() == correct_answer.lower()
+
+            # Retries don't change the score - the first answer to a blank counts
+            if blank_index not in answered:
+                answered[blank_index] = correct
+                if not correct:
+                    missed_words.append(correct_answer)
+
+            completed = sum(answered.values())
+            position = blank_index + 1
+            queue_progress(PracticeProgress(
+                session_id=session_id,
+                completed_blanks=completed,
+                total_blanks=len(blanks),
+                completion_rate=round(completed / len(blanks) * 100),
+                last_practiced=datetime.now(timezone.utc).isoformat(),
+                missed_words=missed_words
+            ))
+
+            await websocket.send_json({
+                "type": "result",
+                "blank_index": blank_index,
+                "correct": correct,
+                "correct_answer": correct_answer,
+                "completed_blanks": completed,
+                "total_blanks": len(blanks),
+                "position": position,
+                "next_blank": _schedule_entry(position, blanks[position]) if position < len(blanks) else None
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Don't leave this student's last answers waiting for the next flush
+        await run_in_threadpool(flush_progress, session_id)
@@ -0,0 +1,287 @@
+import gzip
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import bson
+from pymongo import ReturnDocument
+from backend.app import audio_store
+from backend.app.database import db, ensure_ttl_index
+from backend.app.config import (
+    SESSION_ABANDON_DAYS,
+    SESSION_ARCHIVE_AFTER_DAYS,
+    SESSION_ARCHIVE_DIR,
+    RETENTION_SWEEP_HOURS
+)
+
+# Retention for the sessions collection.
+#
+# - Abandoned sessions (created but never practiced) carry an `abandon_at` date that a TTL
+#   index expires after SESSION_ABANDON_DAYS. Saving practice progress unsets it.
+# - Sessions that were practiced but have been idle for SESSION_ARCHIVE_AFTER_DAYS are
+#   written to SESSION_ARCHIVE_DIR as gzipped BSON and replaced in Mongo by a small stub.
+#   Any read or update through find_session/update_session restores them transparently.
+#   The song is copied out of GridFS into the archive file and put back on restore.
+# - GridFS audio whose session is gone (expired by the TTL) is deleted by the same sweep.
+
+# Fields kept on an archived stub - everything else (lyrics, blanks, audio) lives in the archive file.
+# Practice progress stays so analytics backfills still see archived sessions.
+STUB_FIELDS = (
+    "session_id", "subject", "music_genre", "created_at", "updated_at",
+    "practice_progress", "practice_missed_words"
+)
+
+_restore_lock = threading.Lock()
+
+
+def _archive_path(session_id: str) -> str:
+    return os.path.join(SESSION_ARCHIVE_DIR, f"{os.path.basename(session_id)}.bson.gz")
+
+
+def ensure_indexes():
+    """Create the lookup and TTL indexes the sessions collection relies on"""
+    db.sessions.create_index("session_id")
+    db.sessions.create_index([("archived", 1), ("updated_at", 1)])
+    db.sessions.create_index("audio_file_id", sparse=True)
+
+    ensure_ttl_index(db.sessions, "abandon_at", int(SESSION_ABANDON_DAYS * 24 * 60 * 60))
+
+    # Sessions created before retention existed: mark the never-practiced ones as abandonable
+    db.sessions.update_many(
+        {"practice_progress": {"$exists": False}, "abandon_at": {"$exists": False}, "archived": {"$ne": True}},
+        [{"$set": {"abandon_at": {"$ifNull": ["$created_at", "$$NOW"]}}}]
+    )
+
+
+def archive_session(session_doc: dict) -> str:
+    """Write a full session to the archive directory and shrink its Mongo document to a stub"""
+    os.makedirs(SESSION_ARCHIVE_DIR, exist_ok=True)
+    session_id = session_doc["session_id"]
+    updated_at = session_doc.get("updated_at")
+
+    # Claim the session so overlapping sweeps (admin trigger, other workers) skip it.
+    # A claim older than an hour is from a sweep that died part way and can be taken over.
+    now = datetime.now()
+    claimed = db.sessions.find_one_and_update(
+        {
+            "session_id": session_id,
+            "updated_at": updated_at,
+            "archived": {"$ne": True},
+            "$or": [{"archiving": {"$exists": False}}, {"archiving": {"$lt": now - timedelta(hours=1)}}]
+        },
+        {"$set": {"archiving": now}},
+        projection={"_id": 1}
+    )
+    if not claimed:
+        return None
+
+    # Every archive run writes its own file and the stub records which one, so a run
+    # that loses a race only ever removes its own file
+    session_doc = {key: value for key, value in session_doc.items() if key not in ("_id", "archiving")}
+    audio_file_id = session_doc.pop("audio_file_id", None)
+    if audio_file_id:
+        session_doc["audio_data"] = audio_store.read_bytes(audio_file_id)
+    fd, path = tempfile.mkstemp(dir=SESSION_ARCHIVE_DIR, prefix=f"{os.path.basename(session_id)}.", suffix=".bson.gz")
+    try:
+        with os.fdopen(fd, "wb") as raw_file, gzip.GzipFile(fileobj=raw_file, mode="wb") as archive_file:
+            archive_file.write(bson.BSON.encode(session_doc))
+
+        stub = {key: session_doc[key] for key in STUB_FIELDS if key in session_doc}
+        stub.update({"archived": True, "archived_at": datetime.now(), "archive_file": os.path.basename(path)})
+        # Only replace if nothing touched the session while we were writing the archive
+        result = db.sessions.replace_one(
+            {"session_id": session_id, "updated_at": updated_at, "archiving": now},
+            stub
+        )
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    if result.matched_count == 0:
+        os.unlink(path)
+        db.sessions.update_one({"session_id": session_id, "archiving": now}, {"$unset": {"archiving": ""}})
+        return None
+    if audio_file_id:
+        audio_store.delete(audio_file_id)
+    return path
+
+
+def restore_session(session_id: str) -> bool:
+    """Bring an archived session back into Mongo. Returns False if it is still archived afterwards."""
+    # _restore_lock only serializes this process; other workers are handled by the
+    # conditional replace and by tolerating a file they already removed
+    with _restore_lock:
+        stub = db.sessions.find_one({"session_id": session_id, "archived": True}, {"_id": 1, "archive_file": 1})
+        if not stub:
+            return False
+
+        # Stubs from before archive_file was recorded use the fixed per-session name
+        if stub.get("archive_file"):
+            path = os.path.join(SESSION_ARCHIVE_DIR, stub["archive_file"])
+        else:
+            path = _archive_path(session_id)
+
+        try:
+            with gzip.open(path, "rb") as archive_file:
+                session_doc = bson.BSON(archive_file.read()).decode()
+        except FileNotFoundError:
+            return _restored_elsewhere(stub["_id"], session_id)
+
+        audio_data = session_doc.pop("audio_data", None)
+        if audio_data:
+            session_doc["audio_file_id"] = audio_store.put_bytes(audio_data)
+        # Restoring counts as activity, otherwise the next sweep would archive it straight back
+        session_doc["updated_at"] = datetime.now()
+
+        result = db.sessions.replace_one({"_id": stub["_id"], "archived": True}, session_doc)
+        if result.matched_count == 0:
+            # Another worker restored it first
+            if audio_data:
+                audio_store.delete(session_doc["audio_file_id"])
+            return _restored_elsewhere(stub["_id"], session_id)
+
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        print(f"📦 Restored archived session {session_id}")
+        return True
+
+
+def _restored_elsewhere(stub_id, session_id: str) -> bool:
+    """After losing a restore race (or finding no file): True if the session is live again"""
+    if db.sessions.find_one({"_id": stub_id, "archived": True}, {"_id": 1}):
+        print(f"⚠️  Archive file missing for session {session_id}")
+        return False
+    return True
+
+
+def find_session(session_id: str, projection: dict = None):
+    """find_one for a session that transparently restores it from the archive"""
+    if projection and any(value for value in projection.values()):
+        projection = {**projection, "archived": 1}
+
+    session_doc = db.sessions.find_one({"session_id": session_id}, projection)
+    if session_doc and session_doc.get("archived"):
+        restore_session(session_id)
+        session_doc = db.sessions.find_one({"session_id": session_id}, projection)
+        if session_doc and session_doc.get("archived"):
+            # The archive file is gone - a bare stub is not a usable session
+            return None
+    return session_doc
+
+
+def update_session(session_id: str, update: dict):
+    """update_one for a session, restoring it first if it has been archived"""
+    result = db.sessions.update_one({"session_id": session_id, "archived": {"$ne": True}}, update)
+    if result.matched_count == 0 and restore_session(session_id):
+        result = db.sessions.update_one({"session_id": session_id}, update)
+    return result
+
+
+def find_and_update_session(session_id: str, update: dict, projection: dict = None):
+    """find_one_and_update returning the document as it was before the update, restoring archived sessions first"""
+    session_doc = db.sessions.find_one_and_update(
+        {"session_id": session_id, "archived": {"$ne": True}}, update,
+        projection=projection, return_document=ReturnDocument.BEFORE
+    )
+    if session_doc is None and restore_session(session_id):
+        session_doc = db.sessions.find_one_and_update(
+            {"session_id": session_id}, update,
+            projection=projection, return_document=ReturnDocument.BEFORE
+        )
+    return session_doc
+
+
+def archive_inactive_sessions(limit: int = 500) -> dict:
+    """Archive practiced sessions idle for longer than SESSION_ARCHIVE_AFTER_DAYS"""
+    cutoff = datetime.now() - timedelta(days=SESSION_ARCHIVE_AFTER_DAYS)
+    cursor = db.sessions.find(
+        {
+            "archived": {"$ne": True},
+            "practice_progress": {"$exists": True},
+            "updated_at": {"$lt": cutoff}
+        }
+    ).limit(limit)
+
+    archived = 0
+    bytes_freed = 0
+    for session_doc in cursor:
+        size = len(bson.BSON.encode(session_doc))
+        if session_doc.get("audio_file_id"):
+            size += audio_store.get_length(session_doc["audio_file_id"])
+        if archive_session(session_doc):
+            archived += 1
+            bytes_freed += size
+
+    print(f"📦 Archived {archived} inactive sessions ({bytes_freed / 1024 / 1024:.1f} MB)")
+    return {"archived": archived, "bytes_freed": bytes_freed, "cutoff": cutoff.isoformat()}
+
+
+def compaction_report() -> dict:
+    """How big the sessions collection is, what retention would remove, and whether to compact"""
+    stats = db.command("collStats", "sessions")
+    now = datetime.now()
+    archive_cutoff = now - timedelta(days=SESSION_ARCHIVE_AFTER_DAYS)
+    abandon_cutoff = now - timedelta(days=SESSION_ABANDON_DAYS)
+
+    live = db.sessions.count_documents({"archived": {"$ne": True}})
+    archived = db.sessions.count_documents({"archived": True})
+    pending_expiry = db.sessions.count_documents({"abandon_at": {"$lt": abandon_cutoff}})
+    archive_candidates = db.sessions.count_documents({
+        "archived": {"$ne": True},
+        "practice_progress": {"$exists": True},
+        "updated_at": {"$lt": archive_cutoff}
+    })
+
+    archive_files = []
+    if os.path.isdir(SESSION_ARCHIVE_DIR):
+        archive_files = [entry for entry in os.scandir(SESSION_ARCHIVE_DIR) if entry.name.endswith(".bson.gz")]
+
+    avg_size = stats.get("avgObjSize", 0)
+    data_size = stats.get("size", 0)
+    storage_size = stats.get("storageSize", 0)
+    # WiredTiger keeps freed blocks for reuse; a big gap means compact would give disk back
+    free_ratio = 1 - (data_size / storage_size) if storage_size else 0
+
+    return {
+        "documents": {
+            "live": live,
+            "archived_stubs": archived,
+            "pending_ttl_expiry": pending_expiry,
+            "archive_candidates": archive_candidates
+        },
+        "bytes": {
+            "data_size": data_size,
+            "storage_size": storage_size,
+            "index_size": stats.get("totalIndexSize", 0),
+            "avg_document_size": avg_size,
+            "reclaimable_by_retention": int(avg_size * (pending_expiry + archive_candidates)),
+            "archive_on_disk": sum(entry.stat().st_size for entry in archive_files)
+        },
+        "free_space_ratio": round(free_ratio, 3),
+        "compact_recommended": free_ratio > 0.3,
+        "settings": {
+            "abandon_after_days": SESSION_ABANDON_DAYS,
+            "archive_after_days": SESSION_ARCHIVE_AFTER_DAYS,
+            "archive_dir": SESSION_ARCHIVE_DIR
+        }
+    }
+
+
+def start_retention_sweeper():
+    """Run the archival sweep in the background every RETENTION_SWEEP_HOURS"""
+    if RETENTION_SWEEP_HOURS <= 0:
+        return
+
+    def sweep():
+        while True:
+            try:
+                archive_inactive_sessions()
+                audio_store.delete_orphans()
+            except Exception as e:
+                print(f"Retention sweep error: {e}")
+            time.sleep(RETENTION_SWEEP_HOURS * 60 * 60)
+
+    threading.Thread(target=sweep, daemon=True, name="retention-sweeper").start()
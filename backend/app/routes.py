@@ -1,31 +1,51 @@
+import os
 import uuid
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from backend.app.models import Frontend, Session, Blank
-from typing import List
-from backend.app.services import generate_educational_song
+import hashlib
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from backend.app.models import Frontend, Session, Blank, WordTiming, PracticeProgress
+from typing import List, Optional
+from backend.app.services import (
+    generate_educational_song, rebuild_blanks, DIFFICULTY_BLANKS,
+    create_composition_plan, compose_music_to_file, transcribe_audio_with_timestamps, retime_blanks
+)
 from backend.app.database import db
+from backend.app import audio_cache, audio_store, audio_stream, waveform, bundles
+from backend.app.retention import find_session, update_session
+from backend.app.practice import save_progress_now
+from backend.app import analytics
+from backend.app.tracing import TracedRoute, in_background
+from backend.app.circuit_breaker import ProviderUnavailable, get_breaker_states
+from backend.app.config import BREAKER_RESET_SECONDS, BUNDLE_MAX_SESSIONS
 from pydantic import BaseModel
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
-class PracticeProgress(BaseModel):
-    session_id: str
-    completed_blanks: int
-    total_blanks: int
-    completion_rate: int
-    last_practiced: str
+class ReblankRequest(BaseModel):
+    difficulty: Optional[str] = None  # One of DIFFICULTY_BLANKS
+    num_blanks: Optional[int] = None  # Explicit count, overrides difficulty
 
 @router.post("/start-session")
-def start_session(frontend: Frontend):
-    song_result = generate_educational_song(
-        subject=frontend.subject,
-        concepts=frontend.concepts,
-        music_genre=frontend.music_genre,
-        grade_level=frontend.grade_level
-    )
+def start_session(frontend: Frontend, background_tasks: BackgroundTasks):
+    try:
+        song_result = generate_educational_song(
+            subject=frontend.subject,
+            concepts=frontend.concepts,
+            music_genre=frontend.music_genre,
+            grade_level=frontend.grade_level,
+            compose=not frontend.stream_audio
+        )
+    except ProviderUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Song generation is temporarily unavailable ({e.provider}), please try again shortly",
+            headers={"Retry-After": str(int(BREAKER_RESET_SECONDS))}
+        )
     
+    # Upload the composed audio to GridFS straight from the temp file - the session only keeps its id
+    audio_file_id = audio_store.put_file(song_result["audio_path"]) if song_result["audio_path"] else None
+
     # Create session with audio data and practice materials
     session = Session(
         session_id=str(uuid.uuid4()),
@@ -36,13 +56,29 @@ def start_session(frontend: Frontend):
         lyrics=song_result["lyrics"],
         practiced_lyrics=song_result["practiced_lyrics"],
         blanks=[Blank(**blank) for blank in song_result["blanks"]],
-        audio_data=song_result["audio_data"],
+        word_timings=[WordTiming(**timing) for timing in song_result["word_timings"]],
+        audio_file_id=audio_file_id,
         created_at=datetime.now(),
         updated_at=datetime.now()
     )
     
     # Store session in MongoDB
-    db.sessions.insert_one(session.model_dump())
+    session_doc = session.model_dump()
+    # Expired by the TTL index unless the student practices it (see retention.py)
+    session_doc["abandon_at"] = session.created_at
+    db.sessions.insert_one(session_doc)
+
+    # Move the temp file into the disk cache so the first play is already served from disk
+    if song_result["audio_path"]:
+        audio_cache.put_audio_file(session.session_id, song_result["audio_path"])
+        # Peaks and loudness are ready by the time the player asks for them
+        background_tasks.add_task(in_background(_build_waveform_in_background), session.session_id)
+    elif frontend.stream_audio:
+        # Register before responding so a request to audio_url attaches to this composition
+        live = audio_stream.register(session.session_id)
+        background_tasks.add_task(
+            in_background(_compose_live), session.session_id, song_result["lyrics"], frontend.music_genre, live
+        )
     
     # Create streaming URL
     audio_url = f"/api/audio/{session.session_id}"
@@ -52,50 +88,122 @@ def start_session(frontend: Frontend):
         "lyrics": song_result["lyrics"],
         "practiced_lyrics": song_result["practiced_lyrics"],
         "blanks": song_result["blanks"],
-        "audio_url": audio_url
+        "audio_url": audio_url,
+        # When true the audio is composed on first request to audio_url and blank timings are refined
+        "audio_pending": song_result["audio_pending"],
+        "audio_streaming": frontend.stream_audio
     }
 
 
-@router.get("/api/audio-stream/{session_id}")
-def stream_audio(session_id: str):
-    """Stream audio from session in MongoDB"""
-    session_doc = db.sessions.find_one({"session_id": session_id})
-    
+@router.post("/api/session/{session_id}/reblank")
+def reblank_session(session_id: str, request: ReblankRequest):
+    """Rebuild practiced lyrics and blanks for an existing session at a new difficulty"""
+    if request.num_blanks is not None:
+        num_blanks = request.num_blanks
+    elif request.difficulty is not None:
+        if request.difficulty.lower() not in DIFFICULTY_BLANKS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown difficulty. Choose one of: {', '.join(DIFFICULTY_BLANKS)}"
+            )
+        num_blanks = DIFFICULTY_BLANKS[request.difficulty.lower()]
+    else:
+        raise HTTPException(status_code=400, detail="Provide a difficulty or num_blanks")
+
+    if num_blanks < 1:
+        raise HTTPException(status_code=400, detail="num_blanks must be at least 1")
+
+    # Only load what we need - never the audio
+    session_doc = find_session(session_id, {"lyrics": 1, "blanks": 1, "word_timings": 1})
+
     if not session_doc:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    audio_data = session_doc["audio_data"]
-    
-    def generate():
-        yield audio_data
-    
-    return StreamingResponse(
-        generate(),
-        media_type="audio/mpeg",
-        headers={"Content-Disposition": f"inline; filename={session_id}.mp3"}
-    )
 
+    try:
+        result = rebuild_blanks(
+            lyrics=session_doc.get("lyrics", []),
+            word_timings=session_doc.get("word_timings", []),
+            num_blanks=num_blanks,
+            current_blanks=session_doc.get("blanks", [])
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/api/practice-progress")
-def save_practice_progress(progress: PracticeProgress):
-    """Save practice progress to MongoDB"""
-    # Update the session with practice progress
-    result = db.sessions.update_one(
-        {"session_id": progress.session_id},
+    update_session(
+        session_id,
         {
             "$set": {
-                "practice_progress": {
-                    "completed_blanks": progress.completed_blanks,
-                    "total_blanks": progress.total_blanks,
-                    "completion_rate": progress.completion_rate,
-                    "last_practiced": progress.last_practiced
-                },
+                "practiced_lyrics": result["practiced_lyrics"],
+                "blanks": result["blanks"],
                 "updated_at": datetime.now()
             }
         }
     )
-    
-    if result.matched_count == 0:
+
+    return {
+        "message": "Session re-blanked successfully!",
+        "lyrics": session_doc.get("lyrics", []),
+        "practiced_lyrics": result["practiced_lyrics"],
+        "blanks": result["blanks"],
+        "audio_url": f"/api/audio/{session_id}"
+    }
+
+
+def _load_audio_into_cache(session_id: str):
+    """Stream a session's stored audio from MongoDB into the disk cache, returning its path (None while pending)"""
+    session_doc = find_session(session_id, {"audio_file_id": 1, "audio_data": 1})
+
+    if not session_doc:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return audio_store.cache_session_audio(session_id, session_doc)
+
+
+@router.get("/api/audio-stream/{session_id}")
+def stream_audio(session_id: str):
+    """Stream audio for a session - live while composing, otherwise from the local disk cache (filled from MongoDB on a miss)"""
+    live = audio_stream.get(session_id)
+    reader = live.open_reader() if live else None
+    if reader:
+        return StreamingResponse(
+            reader,
+            media_type="audio/mpeg",
+            headers={"Content-Disposition": f"inline; filename={session_id}.mp3", "Cache-Control": "no-store"}
+        )
+
+    audio_path = audio_cache.get_cached_path(session_id) or _load_audio_into_cache(session_id)
+
+    if not audio_path:
+        raise HTTPException(status_code=404, detail="No audio found")
+
+    return _cached_audio_response(session_id, audio_path, f"inline; filename={session_id}.mp3")
+
+
+def _cached_audio_response(session_id: str, audio_path: str, disposition: str):
+    """FileResponse for a cached object, reloading it from MongoDB if the cache evicted it in the meantime"""
+    for _ in range(2):
+        # Serve the object itself, so relinking the session while we send doesn't matter
+        object_path = os.path.realpath(audio_path)
+        try:
+            stat_result = os.stat(object_path)
+        except FileNotFoundError:
+            audio_path = _load_audio_into_cache(session_id)
+            if not audio_path:
+                raise HTTPException(status_code=404, detail="No audio found")
+            continue
+        return FileResponse(
+            object_path,
+            stat_result=stat_result,
+            media_type="audio/mpeg",
+            headers={"Content-Disposition": disposition}
+        )
+    raise HTTPException(status_code=503, detail="Audio was evicted while serving it, please retry")
+
+
+@router.post("/api/practice-progress")
+def save_practice_progress(progress: PracticeProgress):
+    """Save practice progress to MongoDB"""
+    if not save_progress_now(progress):
         raise HTTPException(status_code=404, detail="Session not found")
     
     return {"message": "Practice progress saved successfully"}
@@ -104,10 +212,7 @@ def save_practice_progress(progress: PracticeProgress):
 @router.get("/api/practice-progress/{session_id}")
 def get_practice_progress(session_id: str):
     """Get practice progress for a session"""
-    session_doc = db.sessions.find_one(
-        {"session_id": session_id},
-        {"practice_progress": 1, "session_id": 1}
-    )
+    session_doc = find_session(session_id, {"practice_progress": 1, "session_id": 1})
     
     if not session_doc:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -123,7 +228,8 @@ def get_practice_progress(session_id: str):
 @router.get("/api/session/{session_id}")
 def get_session_data(session_id: str):
     """Get complete session data for demo mode"""
-    session_doc = db.sessions.find_one({"session_id": session_id})
+    # Audio is streamed separately via /api/audio/{session_id}, so never pull it from Mongo here
+    session_doc = find_session(session_id, {"audio_data": 0, "audio_file_id": 0})
     
     if not session_doc:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -132,49 +238,253 @@ def get_session_data(session_id: str):
     if "_id" in session_doc:
         session_doc["_id"] = str(session_doc["_id"])
     
-    # Keep audio_data but don't include it in JSON response
-    # Audio will be streamed separately via /api/audio/{session_id}
-    if "audio_data" in session_doc:
-        session_doc.pop("audio_data", None)
-    
     return session_doc
 
 
-@router.get("/api/audio/{session_id}")
-def get_audio_file(session_id: str):
-    """Get audio file for a session - either from MongoDB or generate fresh from ElevenLabs"""
-    session_doc = db.sessions.find_one({"session_id": session_id})
-    
-    if not session_doc:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Check if we have audio_data in MongoDB
-    if session_doc.get("audio_data"):
-        # Return cached audio from MongoDB
-        from fastapi.responses import Response
-        return Response(
-            content=session_doc["audio_data"],
-            media_type="audio/mpeg",
-            headers={"Content-Disposition": f"attachment; filename=audio_{session_id}.mp3"}
+def _store_composed_audio(session_id: str, audio_path: str, whisper_result: dict):
+    """Persist a song composed after its session was created, re-timing the session's blanks to it"""
+    audio_file_id = audio_store.put_file(audio_path)
+    for _ in range(3):
+        session_doc = find_session(session_id, {"blanks": 1})
+        if not session_doc:
+            audio_store.delete(audio_file_id)
+            return
+
+        # Re-time the blanks as they are now rather than as they were when composition
+        # started, since a reblank may have landed meanwhile - and only write if they
+        # are still the same when the update runs
+        blanks = session_doc.get("blanks", [])
+        timing = retime_blanks(blanks, whisper_result)
+        result = db.sessions.update_one(
+            {"session_id": session_id, "blanks": blanks},
+            {
+                "$set": {
+                    "audio_file_id": audio_file_id,
+                    "blanks": timing["blanks"],
+                    "word_timings": timing["word_timings"],
+                    "updated_at": datetime.now()
+                }
+            }
         )
-    else:
-        # Generate fresh audio from ElevenLabs using the lyrics
-        from backend.app.services import create_composition_plan, compose_music
-        
-        lyrics = session_doc.get("lyrics", [])
-        music_genre = session_doc.get("music_genre", "pop")
-        
-        if not lyrics:
-            raise HTTPException(status_code=404, detail="No lyrics found")
-        
-        # Create plan and generate audio
+        if result.matched_count:
+            return
+
+    audio_store.delete(audio_file_id)
+    raise RuntimeError(f"Blanks for {session_id} kept changing while storing its audio")
+
+
+def _compose_for_listeners(session_id: str, lyrics: list, music_genre: str, live) -> str:
+    """Compose a song while listeners stream it from the temp file. Returns its path in the disk cache."""
+    try:
         plan = create_composition_plan(lyrics, music_genre)
-        audio_data = compose_music(plan)
-        
-        from fastapi.responses import Response
-        return Response(
-            content=audio_data,
+        audio_path = compose_music_to_file(plan, on_chunk=live.progress)
+        # Current listeners keep reading their descriptor; later ones read the cached file
+        cached_path = audio_cache.put_audio_file(session_id, audio_path)
+    except Exception as e:
+        live.finish(error=str(e))
+        audio_stream.unregister(session_id)
+        raise
+
+    live.finish(final_path=cached_path)
+    audio_stream.unregister(session_id)
+    return cached_path
+
+
+def _retime_and_store(session_id: str, cached_path: str, lyrics: list):
+    """Move blanks onto the finished song's timestamps and persist it, then analyze its waveform"""
+    try:
+        _store_composed_audio(session_id, cached_path, transcribe_audio_with_timestamps(cached_path, lyrics))
+    except Exception as e:
+        print(f"Storing composed audio failed for {session_id}: {e}")
+        return
+    _build_waveform_in_background(session_id)
+
+
+def _compose_live(session_id: str, lyrics: list, music_genre: str, live):
+    """Compose a song in the background for streaming listeners, then store it like any other"""
+    try:
+        cached_path = _compose_for_listeners(session_id, lyrics, music_genre, live)
+    except Exception as e:
+        # The session stays audio_pending, so /api/audio falls back to composing on request
+        print(f"Streaming composition failed for {session_id}: {e}")
+        return
+    _retime_and_store(session_id, cached_path, lyrics)
+
+
+@router.get("/api/audio/{session_id}")
+def get_audio_file(session_id: str, background_tasks: BackgroundTasks):
+    """Get audio file for a session - live while composing, from the disk cache, MongoDB, or generated fresh from ElevenLabs"""
+    live = audio_stream.get(session_id)
+    reader = live.open_reader() if live else None
+    if reader:
+        return StreamingResponse(
+            reader,
             media_type="audio/mpeg",
-            headers={"Content-Disposition": f"attachment; filename=audio_{session_id}.mp3"}
+            headers={"Content-Disposition": f"inline; filename=audio_{session_id}.mp3", "Cache-Control": "no-store"}
+        )
+
+    audio_path = audio_cache.get_cached_path(session_id)
+
+    if not audio_path:
+        session_doc = find_session(
+            session_id, {"lyrics": 1, "music_genre": 1, "audio_file_id": 1, "audio_data": 1}
         )
 
+        if not session_doc:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        audio_path = audio_store.cache_session_audio(session_id, session_doc)
+        if not audio_path:
+            # Audio was deferred (or never stored) - generate it now from ElevenLabs using the lyrics
+            lyrics = session_doc.get("lyrics", [])
+            music_genre = session_doc.get("music_genre", "pop")
+
+            if not lyrics:
+                raise HTTPException(status_code=404, detail="No lyrics found")
+
+            # Only one request composes; concurrent ones stream along instead of composing it again
+            live, composing = audio_stream.claim(session_id)
+            if not composing:
+                reader = live.open_reader()
+                if reader:
+                    return StreamingResponse(
+                        reader,
+                        media_type="audio/mpeg",
+                        headers={"Content-Disposition": f"inline; filename=audio_{session_id}.mp3", "Cache-Control": "no-store"}
+                    )
+                # The other composition just finished (or failed) - serve it if it made it into the cache
+                audio_path = audio_cache.get_cached_path(session_id)
+                if not audio_path:
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Audio is not ready yet",
+                        headers={"Retry-After": str(int(BREAKER_RESET_SECONDS))}
+                    )
+            elif audio_cache.get_cached_path(session_id):
+                # A composition finished between our cache lookup and the claim
+                audio_path = audio_cache.get_cached_path(session_id)
+                live.finish(final_path=audio_path)
+                audio_stream.unregister(session_id)
+            else:
+                try:
+                    audio_path = _compose_for_listeners(session_id, lyrics, music_genre, live)
+                except ProviderUnavailable as e:
+                    raise HTTPException(
+                        status_code=503,
+                        detail=f"Audio is not ready yet ({e.provider} unavailable)",
+                        headers={"Retry-After": str(int(BREAKER_RESET_SECONDS))}
+                    )
+
+                # Persist the finished song (and re-time its blanks with Whisper) after responding
+                background_tasks.add_task(in_background(_retime_and_store), session_id, audio_path, lyrics)
+
+    return _cached_audio_response(session_id, audio_path, f"attachment; filename=audio_{session_id}.mp3")
+
+
+@router.get("/api/analytics/summary")
+def get_analytics_summary(subject: Optional[str] = None, music_genre: Optional[str] = None):
+    """Class-wide completion rates by subject and genre"""
+    return analytics.get_summary(subject, music_genre)
+
+
+@router.get("/api/analytics/missed-blanks")
+def get_missed_blanks(subject: Optional[str] = None, limit: int = 10):
+    """The blank words students miss most"""
+    return analytics.get_missed_blanks(subject, min(limit, 100))
+
+
+@router.get("/api/provider-health")
+def get_provider_health():
+    """Circuit breaker state and counters for each external provider"""
+    return get_breaker_states()
+
+
+def _build_waveform(session_id: str) -> bytes:
+    """Decode a session's audio, pack its peaks/loudness/duration and store them on the session"""
+    audio_path = audio_cache.get_cached_path(session_id) or _load_audio_into_cache(session_id)
+    if not audio_path:
+        return None
+
+    data = waveform.analyze_file(audio_path)
+    update_session(session_id, {"$set": {"waveform": data}})
+    return data
+
+
+def _build_waveform_in_background(session_id: str):
+    try:
+        _build_waveform(session_id)
+    except Exception as e:
+        print(f"Waveform analysis failed for {session_id}: {e}")
+
+
+@router.get("/api/waveform/{session_id}")
+def get_waveform(session_id: str, request: Request):
+    """Packed waveform peaks, per-second loudness and exact duration (format in waveform.py)"""
+    session_doc = find_session(session_id, {"waveform": 1})
+
+    if not session_doc:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    data = session_doc.get("waveform")
+    if not data or not waveform.is_current(data):
+        # Sessions from before waveforms existed (or from an older format) are analyzed on first request
+        try:
+            data = _build_waveform(session_id)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Waveform analysis failed for {session_id}: {e}")
+            raise HTTPException(status_code=503, detail="Waveform analysis failed, try again later")
+        if not data:
+            raise HTTPException(status_code=404, detail="No audio found")
+
+    # The URL names the session, not the content, so clients revalidate every time - a 304 costs one small query
+    etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=bytes(data), media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/api/bundle")
+def get_session_bundle(session_ids: str):
+    """Pack sessions (comma separated ids) into one zip for offline use and redirect to its static URL"""
+    requested = list(dict.fromkeys(session_id.strip() for session_id in session_ids.split(",") if session_id.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No session ids given")
+    if len(requested) > BUNDLE_MAX_SESSIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BUNDLE_MAX_SESSIONS} sessions per bundle")
+
+    try:
+        digest = bundles.get_bundle(requested)
+    except bundles.SessionsNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    # The answer changes whenever a session does, so only the bundle URL itself is cacheable
+    return RedirectResponse(f"/api/bundles/{digest}.zip", status_code=303, headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/api/bundles/{digest}.zip")
+def download_bundle(digest: str, request: Request):
+    """A built bundle, served straight from disk - its name is its content hash, so it never changes"""
+    path = bundles.get_cached_path(digest)
+    if not path:
+        raise HTTPException(status_code=404, detail="Bundle not found - request it again from /api/bundle")
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        headers={**headers, "Content-Disposition": f"attachment; filename=sessions_{digest[:12]}.zip"}
+    )
+
+
+@router.get("/api/audio-cache/stats")
+def get_audio_cache_stats():
+    """Hit/miss/eviction counters for the local audio cache"""
+    return audio_cache.get_stats()
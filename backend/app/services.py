@@ -4,6 +4,11 @@ import json
 import random
 import whisper
 from backend.app.config import GEMINI_API_KEY, ELEVENLABS_API_KEY
+from backend.app import audio_io, plan_cache, llm_memo
+from backend.app.config import PLAN_CACHE_WARM_GENRES
+from backend.app.config import ELEVENLABS_PLAN_DEADLINE_SECONDS, ELEVENLABS_COMPOSE_DEADLINE_SECONDS
+from backend.app.circuit_breaker import breakers, ProviderUnavailable
+from backend.app.tracing import span, traced
 
 # Pre-written scripts for better ElevenLabs output
 DEMO_SCRIPTS = {
@@ -57,13 +62,32 @@ client = genai.Client(api_key=GEMINI_API_KEY)
 # Load Whisper model (base model for good balance of speed/accuracy)
 # whisper_model = whisper.load_model("base")  # Commented out for now
 
-def generate_content(prompt: str):
+GEMINI_MODEL = "gemini-2.5-flash"
+
+def _generate_content(prompt: str):
     response = client.models.generate_content(
-        model="gemini-2.5-flash",
+        model=GEMINI_MODEL,
         contents=prompt
     )
     return response.text
 
+def generate_content(prompt: str, memoize: bool = False):
+    """Call Gemini through its circuit breaker - raises ProviderUnavailable when it is down or too slow.
+
+    With memoize=True the response is looked up in / saved to the LLM memo first. Only use
+    it for prompts whose answer should not change between calls.
+    """
+    if memoize:
+        cached = llm_memo.get(GEMINI_MODEL, prompt)
+        if cached is not None:
+            return cached
+    with span("http gemini generate_content", prompt_chars=len(prompt)):
+        text = breakers["gemini"].call(_generate_content, prompt)
+    if memoize:
+        llm_memo.put(GEMINI_MODEL, prompt, text)
+    return text
+
+@traced("stage generate_lyrics")
 def generate_lyrics(subject: str, concepts: list, music_genre: str, grade_level: str = "high school") -> list:
     """Generate educational lyrics using Gemini AI"""
     concepts_text = ', '.join(concepts) if concepts else ""
@@ -113,8 +137,11 @@ Format: ["lyric line 1", "lyric line 2", "lyric line 3", "lyric line 4", "lyric
     
     return cleaned_lyrics[:8]
 
-def create_composition_plan(lyrics: list, music_genre: str = "pop") -> dict:
-    """Create ElevenLabs composition plan"""
+# Every song is composed at this length, so it is part of the plan template key
+MUSIC_LENGTH_MS = 48000
+
+def fetch_plan_template(music_genre: str, music_length_ms: int = MUSIC_LENGTH_MS) -> dict:
+    """Ask ElevenLabs for a composition plan - only depends on genre and length"""
     url = "https://api.elevenlabs.io/v1/music/plan"
     headers = {
         "xi-api-key": ELEVENLABS_API_KEY,
@@ -122,15 +149,26 @@ def create_composition_plan(lyrics: list, music_genre: str = "pop") -> dict:
     }
     data = {
         "prompt": f"Educational {music_genre} song with 8 lyric lines",
-        "music_length_ms": 48000
+        "music_length_ms": music_length_ms
     }
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    plan = response.json()
+
+    def request_plan():
+        with span("http POST elevenlabs /v1/music/plan"):
+            response = requests.post(url, headers=headers, json=data, timeout=ELEVENLABS_PLAN_DEADLINE_SECONDS)
+        response.raise_for_status()
+        return response.json()
+
+    plan = breakers["elevenlabs_plan"].call(request_plan)
 
     # Debug: Print the original plan structure
     print(f"ElevenLabs original plan: {plan}")
-    
+    return plan
+
+@traced("stage create_composition_plan")
+def create_composition_plan(lyrics: list, music_genre: str = "pop") -> dict:
+    """Create ElevenLabs composition plan from the cached template for this genre"""
+    plan = plan_cache.get_template(music_genre, MUSIC_LENGTH_MS, fetch_plan_template)
+
     # Keep the original plan structure but only modify the first section's lines
     if plan.get("sections"):
         # Only replace the lyrics, keep everything else intact
@@ -140,13 +178,18 @@ def create_composition_plan(lyrics: list, music_genre: str = "pop") -> dict:
         # If there are multiple sections, remove extra sections to keep only our 8 lines
         if len(plan["sections"]) > 1:
             plan["sections"] = [plan["sections"][0]]  # Keep only first section
-            plan["sections"][0]["duration_ms"] = 48000  # Set total duration
+            plan["sections"][0]["duration_ms"] = MUSIC_LENGTH_MS  # Set total duration
     
     print(f"Modified plan: {len(plan.get('sections', []))} section(s)")
     return plan
 
-def compose_music(composition_plan: dict) -> bytes:
-    """Generate music from composition plan"""
+def warm_plan_cache():
+    """Load stored plan templates and fetch any missing ones for the usual genres"""
+    plan_cache.ensure_indexes()
+    plan_cache.load()
+    plan_cache.warm(PLAN_CACHE_WARM_GENRES, MUSIC_LENGTH_MS, fetch_plan_template)
+
+def _compose_request(composition_plan: dict):
     url = "https://api.elevenlabs.io/v1/music"
     headers = {
         "xi-api-key": ELEVENLABS_API_KEY,
@@ -157,14 +200,17 @@ def compose_music(composition_plan: dict) -> bytes:
         "output_format": "mp3_44100_128",
         "respect_sections_durations": True
     }
-    response = requests.post(url, headers=headers, json=data)
-    
-    if not response.ok:
-        print(f"ElevenLabs music generation error: {response.status_code}")
-        print(f"Response: {response.text}")
-        response.raise_for_status()
-    
-    return response.content
+    return url, headers, data
+
+@traced("stage compose_music")
+def compose_music_to_file(composition_plan: dict, on_chunk=None) -> str:
+    """Generate music from composition plan, streaming the MP3 straight into a temp file"""
+    url, headers, data = _compose_request(composition_plan)
+    with span("http POST elevenlabs /v1/music (streamed to file)"):
+        return breakers["elevenlabs_compose"].call(
+            audio_io.download_to_tempfile, url, headers, data,
+            deadline=ELEVENLABS_COMPOSE_DEADLINE_SECONDS, on_chunk=on_chunk
+        )
 
 # Whisper will be loaded lazily when first needed
 whisper_model = None
@@ -178,20 +224,13 @@ def get_whisper_model():
         print("Whisper model loaded successfully!")
     return whisper_model
 
-def transcribe_audio_with_timestamps(audio_data: bytes, lyrics: list) -> dict:
-    """Use Whisper to get word-level timestamps for the audio"""
+@traced("stage transcribe_audio")
+def transcribe_audio_with_timestamps(audio_path: str, lyrics: list) -> dict:
+    """Use Whisper to get word-level timestamps for the audio file"""
     try:
-        # Save audio data to temporary file for Whisper
-        import tempfile
-        import os
-        
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
-        
         # Get Whisper model and transcribe with word-level timestamps
         model = get_whisper_model()
-        result = model.transcribe(temp_file_path, word_timestamps=True)
+        result = model.transcribe(audio_path, word_timestamps=True)
         
         # Extract words from segments if available
         words = []
@@ -203,23 +242,25 @@ def transcribe_audio_with_timestamps(audio_data: bytes, lyrics: list) -> dict:
         # Add words to result for compatibility
         result['words'] = words
         
-        # Clean up temp file
-        os.unlink(temp_file_path)
-        
         return result
         
     except Exception as e:
         print(f"Whisper transcription error: {e}")
         # Return mock result if Whisper fails
-        return {
-            "text": " ".join(lyrics),
-            "words": [
-                {"word": word.strip('.,!?;:"()[]{}'), "start": i * 2.0, "end": (i + 1) * 2.0}
-                for i, line in enumerate(lyrics) for word in line.split()
-            ],
-            "segments": []
-        }
+        return estimate_timestamps(lyrics)
 
+def estimate_timestamps(lyrics: list) -> dict:
+    """Whisper-shaped result with evenly spaced guesses, for when there is no audio to transcribe"""
+    return {
+        "text": " ".join(lyrics),
+        "words": [
+            {"word": word.strip('.,!?;:"()[]{}'), "start": i * 2.0, "end": (i + 1) * 2.0}
+            for i, line in enumerate(lyrics) for word in line.split()
+        ],
+        "segments": []
+    }
+
+@traced("stage select_blanks")
 def select_words_for_blanks_with_gemini(lyrics: list, subject: str, concepts: list, num_blanks: int = 4) -> list:
     """Use Gemini to intelligently select the most important words for blanks"""
     
@@ -248,7 +289,13 @@ Format: ["word1", "word2", "word3", "word4"]
 CRITICAL: Return ONLY the JSON array. No explanations, no formatting, no extra text.
 """
     
-    response_text = generate_content(prompt)
+    try:
+        # Same lyrics and concepts always deserve the same blanks, so this is memoized
+        # (demo scripts and regenerated sessions stop paying a Gemini round trip)
+        response_text = generate_content(prompt, memoize=True)
+    except ProviderUnavailable as e:
+        print(f"⚡ Skipping Gemini word selection ({e.reason}), using heuristic picker")
+        return select_words_for_blanks_fallback(lyrics, num_blanks)
     
     try:
         # Parse the JSON response
@@ -291,12 +338,18 @@ CRITICAL: Return ONLY the JSON array. No explanations, no formatting, no extra t
         print(f"🎯 Selected {len(blanks_info)} unique words for blanks")
         for i, blank in enumerate(blanks_info):
             print(f"  {i+1}. '{blank['original_word']}' (line {blank['line_index']}, word {blank['word_position']})")
-        
+
+        if len(blanks_info) < num_blanks:
+            # Usable this once, but not worth pinning - the next call asks Gemini again
+            llm_memo.forget(GEMINI_MODEL, prompt)
+
         return blanks_info[:num_blanks]
         
     except Exception as e:
         print(f"Error parsing Gemini response for word selection: {e}")
         print(f"Response was: {response_text}")
+        # Don't keep serving a response we can't parse
+        llm_memo.forget(GEMINI_MODEL, prompt)
         # Fallback to simple selection
         return select_words_for_blanks_fallback(lyrics, num_blanks)
 
@@ -322,6 +375,7 @@ def select_words_for_blanks_fallback(lyrics: list, num_blanks: int = 4) -> list:
     else:
         return random.sample(all_words, num_blanks)
 
+@traced("stage create_practiced_lyrics")
 def create_practiced_lyrics(lyrics: list, blanks_info: list) -> list:
     """Create practiced lyrics with blanks replacing selected words"""
     practiced_lyrics = lyrics.copy()
@@ -339,6 +393,7 @@ def create_practiced_lyrics(lyrics: list, blanks_info: list) -> list:
     
     return practiced_lyrics
 
+@traced("stage create_blanks_with_timestamps")
 def create_blanks_with_timestamps(blanks_info: list, whisper_result: dict) -> list:
     """Create Blank objects with timing information from Whisper - matching in chronological order"""
     blanks = []
@@ -404,8 +459,115 @@ def create_blanks_with_timestamps(blanks_info: list, whisper_result: dict) -> li
     
     return blanks
 
-def generate_educational_song(subject: str, concepts: list, music_genre: str = "pop", grade_level: str = "high school") -> dict:
-    """Complete pipeline: generate lyrics, select blanks, compose music, and create practice materials"""
+# Number of blanks for each difficulty level when re-blanking a session
+DIFFICULTY_BLANKS = {
+    'easy': 2,
+    'medium': 4,
+    'hard': 6,
+    'expert': 8
+}
+
+def extract_word_timings(whisper_result: dict) -> list:
+    """Reduce Whisper words to the word/start/end fields we store with a session"""
+    return [
+        {
+            'word': str(word.get('word', '')).strip(),
+            'start': float(word.get('start', 0.0)),
+            'end': float(word.get('end', 0.0))
+        }
+        for word in whisper_result.get('words', [])
+    ]
+
+def rebuild_blanks(lyrics: list, word_timings: list, num_blanks: int, current_blanks: list = None) -> dict:
+    """Re-blank existing lyrics locally using stored word timings - no provider calls.
+
+    Words already chosen for the session (originally picked by Gemini) are kept first,
+    then topped up with the heuristic picker when more blanks are requested. Raises
+    ValueError when the song doesn't have num_blanks distinct words to blank.
+    """
+    blanks_info = []
+    used_positions = set()
+    used_words = set()
+    # Timings already on the kept blanks, for sessions stored before word timings existed
+    kept_timings = {}
+
+    for blank in sorted(current_blanks or [], key=lambda b: (b['line_index'], b['word_position'])):
+        key = (blank['line_index'], blank['word_position'])
+        if key not in used_positions:
+            blanks_info.append({
+                'line_index': blank['line_index'],
+                'word_position': blank['word_position'],
+                'original_word': blank['original_word']
+            })
+            used_positions.add(key)
+            used_words.add(blank['original_word'].lower())
+            kept_timings[key] = (blank.get('start_time', 0.0), blank.get('end_time', 0.0))
+
+    if len(blanks_info) < num_blanks:
+        candidates = select_words_for_blanks_fallback(lyrics, num_blanks=len(lyrics) * 20)
+        random.shuffle(candidates)
+        for candidate in candidates:
+            key = (candidate['line_index'], candidate['word_position'])
+            word = candidate['original_word'].lower()
+            if key not in used_positions and word not in used_words:
+                blanks_info.append(candidate)
+                used_positions.add(key)
+                used_words.add(word)
+
+        if len(blanks_info) < num_blanks:
+            raise ValueError(f"This song only has {len(blanks_info)} words that can be blanked")
+
+    blanks_info = blanks_info[:num_blanks]
+
+    practiced_lyrics = create_practiced_lyrics(lyrics, blanks_info)
+    if word_timings:
+        blanks = [blank.model_dump() for blank in create_blanks_with_timestamps(blanks_info, {'words': word_timings})]
+    else:
+        # No word timings to match against - keep the stored times of kept blanks and only estimate new ones
+        kept = [info for info in blanks_info if (info['line_index'], info['word_position']) in kept_timings]
+        added = [info for info in blanks_info if (info['line_index'], info['word_position']) not in kept_timings]
+        blanks = [blank.model_dump() for blank in create_blanks_with_timestamps(added, {'words': []})]
+        for info in kept:
+            start_time, end_time = kept_timings[(info['line_index'], info['word_position'])]
+            blanks.append(Blank(**info, start_time=start_time, end_time=end_time).model_dump())
+        blanks.sort(key=lambda blank: blank['start_time'])
+
+    return {
+        "practiced_lyrics": practiced_lyrics,
+        "blanks": blanks
+    }
+
+def find_fallback_script(subject: str, concepts: list):
+    """Find a pre-written script matching the subject or its concepts, for when Gemini is unavailable"""
+    subject_lower = subject.strip().lower()
+    for script_subject, script in DEMO_SCRIPTS.items():
+        if script_subject.lower() == subject_lower:
+            return script
+
+    wanted = {concept.strip().lower() for concept in concepts or []}
+    best, best_overlap = None, 0
+    for script in DEMO_SCRIPTS.values():
+        overlap = len(wanted & {concept.lower() for concept in script['concepts']})
+        if overlap > best_overlap:
+            best, best_overlap = script, overlap
+    return best
+
+def retime_blanks(blanks: list, whisper_result: dict) -> dict:
+    """Move existing blanks onto their real timestamps in a transcribed song"""
+    timed_blanks = create_blanks_with_timestamps(blanks, whisper_result)
+
+    return {
+        "blanks": [blank.model_dump() for blank in timed_blanks],
+        "word_timings": extract_word_timings(whisper_result)
+    }
+
+@traced("stage generate_educational_song")
+def generate_educational_song(subject: str, concepts: list, music_genre: str = "pop", grade_level: str = "high school", compose: bool = True) -> dict:
+    """Complete pipeline: generate lyrics, select blanks, compose music, and create practice materials.
+
+    With compose=False the song is returned with audio_pending set, for callers that
+    compose it afterwards (streaming mode).
+    """
     print("🎵 Generating lyrics...")
     
     # Check if we should use a pre-written demo script for better ElevenLabs output
@@ -415,19 +577,38 @@ def generate_educational_song(subject: str, concepts: list, music_genre: str = "
         lyrics = demo_data['lyrics']
         concepts = demo_data['concepts']
     else:
-        lyrics = generate_lyrics(subject, concepts, music_genre, grade_level)
+        try:
+            lyrics = generate_lyrics(subject, concepts, music_genre, grade_level)
+        except ProviderUnavailable as e:
+            # Degrade to the closest pre-written script rather than waiting on Gemini
+            fallback = find_fallback_script(subject, concepts)
+            if not fallback:
+                raise
+            print(f"⚡ Gemini unavailable ({e.reason}), serving pre-written {fallback['subject']} script")
+            lyrics = fallback['lyrics']
+            concepts = fallback['concepts']
     
     print("🧠 Selecting key words for blanks with Gemini...")
     # Select blanks FIRST so we know which words to emphasize
     blanks_info = select_words_for_blanks_with_gemini(lyrics, subject, concepts, num_blanks=4)
     
-    print("🎼 Creating composition plan...")
-    plan = create_composition_plan(lyrics, music_genre)
-    
-    print("🎤 Composing music with ElevenLabs...")
-    audio_data = compose_music(plan)
-    
-    whisper_result = transcribe_audio_with_timestamps(audio_data, lyrics)
+    audio_path = None
+    if compose:
+        try:
+            print("🎼 Creating composition plan...")
+            plan = create_composition_plan(lyrics, music_genre)
+            
+            print("🎤 Composing music with ElevenLabs...")
+            # Audio stays on disk from here on - callers store it and remove the temp file
+            audio_path = compose_music_to_file(plan)
+        except ProviderUnavailable as e:
+            # Return lyrics now; /api/audio composes the song on first request once ElevenLabs recovers
+            print(f"⚡ ElevenLabs unavailable ({e.reason}), deferring audio")
+    
+    if audio_path:
+        whisper_result = transcribe_audio_with_timestamps(audio_path, lyrics)
+    else:
+        whisper_result = estimate_timestamps(lyrics)
     
     print("📝 Creating practice materials...")
     # Create practiced lyrics with blanks
@@ -444,5 +625,7 @@ def generate_educational_song(subject: str, concepts: list, music_genre: str = "
         "lyrics": lyrics,
         "practiced_lyrics": practiced_lyrics,
         "blanks": [blank.model_dump() for blank in blanks],
-        "audio_data": audio_data
+        "word_timings": extract_word_timings(whisper_result),
+        "audio_path": audio_path,
+        "audio_pending": audio_path is None
     } 
\ No newline at end of file
@@ -0,0 +1,324 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from backend.app.config import (
+    TRACING_ENABLED, TRACE_BUFFER_SIZE, TRACE_FILE, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES
+)
+
+# Per-request span trees.
+#
+# The HTTP middleware in main.py opens a trace for each request; span() adds children
+# for pipeline stages and provider calls, and MongoSpanListener adds one per Mongo
+# command. Finished traces go to an in-memory ring buffer (and TRACE_FILE as JSON lines
+# if set, written by a background thread so requests never wait on disk). With no
+# active trace span() is a single ContextVar lookup. BackgroundTasks run after the
+# request trace has been recorded, so tasks wrapped with in_background() get a trace
+# of their own that points back at the request's via parent_trace_id.
+#
+# Admins can also turn on sampling CPU profiling for a fraction of requests. Sampled
+# handlers get a background thread that snapshots the handler thread's stack every
+# PROFILE_INTERVAL_MS and writes collapsed stacks (flamegraph.pl / speedscope format)
+# to PROFILE_DIR, keeping the newest PROFILE_MAX_FILES.
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_file_queue = queue.Queue(maxsize=TRACE_BUFFER_SIZE)  # Traces waiting for the TRACE_FILE writer
+_file_writer_lock = threading.Lock()
+_file_writer = None
+_profile_lock = threading.Lock()
+
+profiling = {"sample_rate": 0.0}
+
+
+class Span:
+    def __init__(self, name: str, trace, attrs: dict = None):
+        self.name = name
+        self.trace = trace
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.children = []
+
+    def finish(self, duration: float = None):
+        self.duration = duration if duration is not None else time.perf_counter() - self.start
+
+    def to_dict(self) -> dict:
+        span = {
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.root.start) * 1000, 2),
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "children": [child.to_dict() for child in self.children]
+        }
+        if self.attrs:
+            span["attrs"] = self.attrs
+        if self.error:
+            span["error"] = self.error
+        return span
+
+
+class Trace:
+    def __init__(self, name: str, attrs: dict = None, parent_trace_id: str = None):
+        self.trace_id = uuid.uuid4().hex
+        self.parent_trace_id = parent_trace_id
+        self.started_at = time.time()
+        self.root = Span(name, self, attrs)
+        # Only request handlers are profiled (see _traced_endpoint)
+        self.profile = parent_trace_id is None and random.random() < profiling["sample_rate"]
+
+    def to_dict(self) -> dict:
+        trace_dict = {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "profiled": self.profile,
+            **self.root.to_dict()
+        }
+        if self.parent_trace_id:
+            trace_dict["parent_trace_id"] = self.parent_trace_id
+        return trace_dict
+
+
+@contextmanager
+def start_trace(name: str, parent_trace_id: str = None, **attrs):
+    """Open a trace for one request (or background task) and record it when the block exits"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    trace = Trace(name, attrs, parent_trace_id)
+    token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.root.finish()
+        _record(trace)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record a child span of whatever span is active - a no-op outside a trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent.trace, attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = repr(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions, e.g. pipeline stages"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_background(fn):
+    """Wrap fn for BackgroundTasks.add_task so it records its own trace, linked to the current request's"""
+    parent = _current_span.get()
+    parent_trace_id = parent.trace.trace_id if parent is not None else None
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with start_trace(f"background {fn.__name__}", parent_trace_id=parent_trace_id):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _write_trace_file():
+    """Append queued traces to TRACE_FILE, a batch at a time"""
+    with open(TRACE_FILE, "a") as trace_file:
+        while True:
+            batch = [_file_queue.get()]
+            while not _file_queue.empty() and len(batch) < 100:
+                batch.append(_file_queue.get_nowait())
+            try:
+                trace_file.write("".join(json.dumps(trace_dict, default=str) + "\n" for trace_dict in batch))
+                trace_file.flush()
+            except Exception as e:
+                print(f"Trace file write error: {e}")
+
+
+def _queue_for_file(trace_dict: dict):
+    global _file_writer
+    if _file_writer is None:
+        with _file_writer_lock:
+            if _file_writer is None:
+                _file_writer = threading.Thread(target=_write_trace_file, daemon=True, name="trace-writer")
+                _file_writer.start()
+    try:
+        _file_queue.put_nowait(trace_dict)
+    except queue.Full:
+        pass  # Disk can't keep up - the trace is still in the ring buffer
+
+
+def _record(trace: Trace):
+    trace_dict = trace.to_dict()
+    _traces.append(trace_dict)
+    if TRACE_FILE:
+        _queue_for_file(trace_dict)
+
+
+def get_traces(limit: int = 50) -> list:
+    """Most recent traces first"""
+    return list(_traces)[-limit:][::-1]
+
+
+def get_trace(trace_id: str):
+    for trace_dict in _traces:
+        if trace_dict["trace_id"] == trace_id:
+            return trace_dict
+    return None
+
+
+def get_background_traces(trace_id: str) -> list:
+    """Traces of the background tasks a request started"""
+    return [trace_dict for trace_dict in _traces if trace_dict.get("parent_trace_id") == trace_id]
+
+
+def set_profile_sample_rate(sample_rate: float):
+    profiling["sample_rate"] = max(0.0, min(1.0, sample_rate))
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".folded"))
+
+
+class _StackSampler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="stack-sampler")
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as profile_file:
+            for stack, count in self.samples.most_common():
+                profile_file.write(f"{stack} {count}\n")
+
+
+def _save_profile(sampler: _StackSampler, profile_name: str):
+    """Write a profile and delete the oldest ones beyond PROFILE_MAX_FILES"""
+    with _profile_lock:
+        sampler.save(os.path.join(PROFILE_DIR, profile_name))
+        profiles = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".folded")]
+        if len(profiles) <= PROFILE_MAX_FILES:
+            return
+        profiles.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in profiles[:-PROFILE_MAX_FILES]:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _traced_endpoint(endpoint):
+    """Wrap a sync route handler in a span, sampling its CPU profile if the trace was picked"""
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        with span(f"handler {endpoint.__name__}") as handler_span:
+            if handler_span is None or not handler_span.trace.profile:
+                return endpoint(*args, **kwargs)
+
+            # Sync handlers run on a threadpool thread - sample exactly that thread
+            sampler = _StackSampler(threading.get_ident())
+            profile_name = f"{handler_span.trace.trace_id}.folded"
+            handler_span.attrs["profile"] = profile_name
+            try:
+                with sampler:
+                    return endpoint(*args, **kwargs)
+            finally:
+                _save_profile(sampler, profile_name)
+
+    wrapper._traced = True
+    return wrapper
+
+
+class TracedRoute(APIRoute):
+    """APIRoute that records a handler span for each sync endpoint"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        # include_router rebuilds routes from already-wrapped endpoints, so only wrap once
+        if not inspect.iscoroutinefunction(endpoint) and not getattr(endpoint, "_traced", False):
+            endpoint = _traced_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class MongoSpanListener(monitoring.CommandListener):
+    """Adds a span for every Mongo command issued while a trace is active"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is not None:
+            child = Span(f"mongo {event.command_name}", parent.trace, {"collection": event.command.get(event.command_name)})
+            parent.children.append(child)
+            self._pending[event.request_id] = child
+
+    def succeeded(self, event):
+        child = self._pending.pop(event.request_id, None)
+        if child is not None:
+            child.finish(event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        child = self._pending.pop(event.request_id, None)
+        if child is not None:
+            child.error = str(event.failure)
+            child.finish(event.duration_micros / 1_000_000)
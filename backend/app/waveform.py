@@ -0,0 +1,90 @@
+import struct
+import subprocess
+import numpy as np
+
+# Precomputed waveform data so the player can draw the song and place blank markers
+# without downloading and decoding the MP3.
+#
+# Binary layout (little-endian), about 2 KB for a 48 second song:
+#   4s   magic b"MMWF"
+#   B    format version (1)
+#   B    reserved
+#   H    analysis sample rate (Hz)
+#   f    exact duration in seconds
+#   I    number of peak buckets N
+#   I    number of loudness seconds S
+#   b*2N peaks as interleaved (min, max) pairs, scaled to -127..127
+#   b*S  loudness per second in dBFS (RMS), clamped to -127..0
+
+MAGIC = b"MMWF"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHfII")
+
+ANALYSIS_SAMPLE_RATE = 8000  # Plenty for drawing peaks and loudness
+PEAK_BUCKETS = 1000
+
+
+def decode_pcm(audio_path: str, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray:
+    """Decode an audio file to mono float32 PCM in [-1, 1] with ffmpeg (already required by Whisper)"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"
+    ]
+    output = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def compute_peaks(pcm: np.ndarray, buckets: int = PEAK_BUCKETS) -> np.ndarray:
+    """Min/max per bucket, interleaved and scaled to int8"""
+    if pcm.size == 0:
+        return np.zeros(0, np.int8)
+    buckets = min(buckets, pcm.size)
+    # Evenly spaced bucket starts, so every bucket holds real samples
+    starts = np.linspace(0, pcm.size, buckets, endpoint=False).astype(np.int64)
+
+    peaks = np.empty((buckets, 2), np.float32)
+    peaks[:, 0] = np.minimum.reduceat(pcm, starts)
+    peaks[:, 1] = np.maximum.reduceat(pcm, starts)
+    return np.clip(np.round(peaks * 127), -127, 127).astype(np.int8).ravel()
+
+
+def compute_loudness(pcm: np.ndarray, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray:
+    """RMS loudness for each second of audio in dBFS, as int8"""
+    seconds = -(-pcm.size // sample_rate)
+    if seconds == 0:
+        return np.zeros(0, np.int8)
+    padded = np.zeros(seconds * sample_rate, np.float32)
+    padded[:pcm.size] = pcm
+    frames = padded.reshape(seconds, sample_rate)
+
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    db = 20 * np.log10(np.maximum(rms, 1e-7))
+    return np.clip(np.round(db), -127, 0).astype(np.int8)
+
+
+def encode(pcm: np.ndarray, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> bytes:
+    peaks = compute_peaks(pcm)
+    loudness = compute_loudness(pcm, sample_rate)
+    header = HEADER.pack(MAGIC, VERSION, 0, sample_rate, pcm.size / sample_rate, peaks.size // 2, loudness.size)
+    return header + peaks.tobytes() + loudness.tobytes()
+
+
+def is_current(data: bytes) -> bool:
+    """Whether stored waveform data is in this module's format version"""
+    return len(data) >= HEADER.size and data[:4] == MAGIC and data[4] == VERSION
+
+
+def decode(data: bytes) -> dict:
+    """Inverse of encode, for tools and debugging"""
+    magic, version, _, sample_rate, duration, num_peaks, num_seconds = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 waveform")
+    offset = HEADER.size
+    peaks = np.frombuffer(data, np.int8, num_peaks * 2, offset).reshape(num_peaks, 2)
+    loudness = np.frombuffer(data, np.int8, num_seconds, offset + num_peaks * 2)
+    return {"sample_rate": sample_rate, "duration": duration, "peaks": peaks, "loudness": loudness}
+
+
+def analyze_file(audio_path: str) -> bytes:
+    """Decode an audio file and return its packed waveform data"""
+    return encode(decode_pcm(audio_path))
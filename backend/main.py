@@ -1,6 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from backend.app.routes import router
+from backend.app.admin import admin_router
+from backend.app.practice import practice_router, start_progress_flusher, flush_progress
+from backend.app import retention, tracing, analytics, llm_memo
+from backend.app.services import warm_plan_cache
 
 app = FastAPI()
 
@@ -13,7 +17,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with tracing.start_trace(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+        if trace is not None:
+            trace.root.attrs["status_code"] = response.status_code
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+
+
 app.include_router(router) 
+app.include_router(admin_router)
+app.include_router(practice_router)
+
+
+@app.on_event("startup")
+def start_retention():
+    retention.ensure_indexes()
+    analytics.ensure_indexes()
+    retention.start_retention_sweeper()
+
+
+@app.on_event("startup")
+def start_plan_cache():
+    warm_plan_cache()
+
+
+@app.on_event("startup")
+def start_llm_memo():
+    llm_memo.ensure_indexes()
+
+
+@app.on_event("startup")
+def start_practice_flusher():
+    start_progress_flusher()
+
+
+@app.on_event("shutdown")
+def flush_practice_progress():
+    flush_progress()
 
 
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark peak memory of the /start-session audio path, before and after streaming audio to GridFS
+
+Serves Song1.mp3 from a local fake provider and runs N concurrent "sessions" through
+the audio handling only (download -> Whisper hand-off -> storage -> BSON encode).
+Gemini and Whisper themselves are left out since they cost the same in both modes, and
+so is the MongoDB round trip: "after" BSON-encodes each GridFS chunk document the way
+the driver does, without a server.
+
+Usage: python benchmark_session_memory.py [concurrency ...]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+SONG_PATH = os.path.join(os.path.dirname(__file__), 'Song1.mp3')
+GRIDFS_CHUNK_SIZE = 255 * 1024  # Same as audio_store.CHUNK_SIZE, without importing the Mongo client
+
+
+class FakeProvider(BaseHTTPRequestHandler):
+    """Answers every POST with Song1.mp3, like ElevenLabs /v1/music"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with open(SONG_PATH, 'rb') as song:
+            body = song.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_session(audio_file_id: str = None):
+    from backend.app.models import Session
+    return Session(
+        session_id='benchmark',
+        subject='Benchmark',
+        concepts=[],
+        music_genre='pop',
+        notes='',
+        lyrics=[],
+        practiced_lyrics=[],
+        blanks=[],
+        audio_file_id=audio_file_id,
+        created_at=datetime.now(),
+        updated_at=datetime.now()
+    )
+
+
+def before(url: str):
+    """The original pipeline: response.content, temp file for Whisper, full model_dump"""
+    import bson
+    import requests
+
+    audio_data = requests.post(url, json={}).content
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+        temp_file.write(audio_data)
+    session_doc = make_session().model_dump()
+    session_doc['audio_data'] = audio_data
+    bson.BSON.encode(session_doc)
+    os.unlink(temp_file.name)
+
+
+def after(url: str):
+    """The current pipeline: streamed to disk, uploaded to GridFS chunk by chunk, only the id in the session"""
+    import bson
+    from bson import Binary, ObjectId
+    from backend.app.audio_io import download_to_tempfile, discard
+
+    audio_path = download_to_tempfile(url, {}, {})
+    file_id = ObjectId()
+    with open(audio_path, 'rb') as audio_file:
+        for n, chunk in enumerate(iter(lambda: audio_file.read(GRIDFS_CHUNK_SIZE), b'')):
+            bson.BSON.encode({'files_id': file_id, 'n': n, 'data': Binary(chunk)})
+    bson.BSON.encode(make_session(str(file_id)).model_dump())
+    discard(audio_path)
+
+
+def run_mode(mode: str, concurrency: int):
+    """Run one mode in this process and print its peak memory"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/v1/music'
+
+    pipeline = before if mode == 'before' else after
+    pipeline(url)  # warm up imports and connection pools outside the measurement
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    barrier = threading.Barrier(concurrency)
+
+    def worker():
+        barrier.wait()
+        pipeline(url)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    server.shutdown()
+
+    # ru_maxrss is KiB on Linux
+    print(f'{peak_traced / concurrency / 1024 / 1024:.2f} {(peak_rss - baseline_rss) / concurrency / 1024:.2f}')
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], int(sys.argv[3]))
+        return
+
+    levels = [int(arg) for arg in sys.argv[1:]] or [1, 4, 8]
+    song_mb = os.path.getsize(SONG_PATH) / 1024 / 1024
+    print(f'🎵 Song size: {song_mb:.2f} MB')
+    print(f"{'concurrency':>11}  {'mode':>6}  {'peak alloc/session MB':>22}  {'peak RSS growth/session MB':>27}")
+
+    for concurrency in levels:
+        for mode in ('before', 'after'):
+            # Fresh process per run so ru_maxrss is not polluted by the previous mode
+            output = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, str(concurrency)],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            print(f'{concurrency:>11}  {mode:>6}  {float(output[0]):>22.2f}  {float(output[1]):>27.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
 from backend.app.services import generate_educational_song
 from backend.app.database import db
+from backend.app.audio_io import discard
+from backend.app import audio_store
 import uuid
 from datetime import datetime
 
@@ -61,6 +63,9 @@ def generate_and_save_demo_songs():
             
             # Create session document for MongoDB
             session_id = str(uuid.uuid4())
+            audio_size = os.path.getsize(result['audio_path'])
+            audio_file_id = audio_store.put_file(result['audio_path'])
+            discard(result['audio_path'])
             session_doc = {
                 'session_id': session_id,
                 'subject': config['subject'],
@@ -71,7 +76,8 @@ def generate_and_save_demo_songs():
                 'lyrics': result['lyrics'],
                 'practiced_lyrics': result['practiced_lyrics'],
                 'blanks': result['blanks'],
-                'audio_data': result['audio_data'],
+                'word_timings': result['word_timings'],
+                'audio_file_id': audio_file_id,
                 'created_at': datetime.now(),
                 'practice_progress': {
                     'completed_blanks': 0,
@@ -87,7 +93,7 @@ def generate_and_save_demo_songs():
             print(f"✅ Saved {config['subject']} song to MongoDB")
             print(f"   Session ID: {session_id}")
             print(f"   Blanks: {len(result['blanks'])}")
-            print(f"   Audio size: {len(result['audio_data'])} bytes")
+            print(f"   Audio size: {audio_size} bytes")
             
         except Exception as e:
             print(f"❌ Error generating {config['subject']}: {str(e)}")
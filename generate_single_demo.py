@@ -9,6 +9,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
 from backend.app.services import generate_educational_song
 from backend.app.database import db
+from backend.app.audio_io import discard
+from backend.app import audio_store
 import uuid
 from datetime import datetime
 
@@ -58,6 +60,8 @@ def generate_single_demo_song(subject):
         
         # Create session document
         session_id = str(uuid.uuid4())
+        audio_file_id = audio_store.put_file(result['audio_path'])
+        discard(result['audio_path'])
         session_doc = {
             'session_id': session_id,
             'subject': subject,
@@ -68,7 +72,8 @@ def generate_single_demo_song(subject):
             'lyrics': result['lyrics'],
             'practiced_lyrics': result['practiced_lyrics'],
             'blanks': result['blanks'],
-            'audio_data': result['audio_data'],
+            'word_timings': result['word_timings'],
+            'audio_file_id': audio_file_id,
             'created_at': datetime.now(),
             'practice_progress': {
                 'completed_blanks': 0,